@@ -1,9 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, g
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
-import bcrypt
+import sys
+import time
+
+# The composition modules live in src/ and import each other by plain name
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from composer import EXPORT_FORMATS
+from composition_jobs import CompositionQueue, QueueFull, DONE
+from password_hasher import PasswordHasher, HasherBusy, DEFAULT_ROUNDS
+from user_store import open_user_store, UserExists, UserStoreError
+import metrics
 
 # Load .env file
 load_dotenv()
@@ -16,10 +27,52 @@ app.config['JWT_SECRET_KEY'] = 'super-secret-key'  # Replace this with a secure
 # Init JWT
 jwt = JWTManager(app)
 
-# MongoDB client
-client = MongoClient(MONGO_URI)
-db = client['music_app']
-users = db['users']
+# User accounts: MongoDB with a bounded connection pool and a unique username
+# index, both set up on the first request rather than at import.
+# USER_STORE_URI=sqlite:///users.db (or sqlite:// in memory) runs offline.
+users = open_user_store(
+    os.getenv("USER_STORE_URI") or MONGO_URI,
+    max_pool_size=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    min_pool_size=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+)
+
+# Password hashing runs on its own bounded pool; a login burst gets fast 429s
+# instead of starving the other routes. BCRYPT_ROUNDS sets the cost factor.
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv("BCRYPT_ROUNDS", str(DEFAULT_ROUNDS))),
+    workers=int(os.getenv("AUTH_WORKERS", "2")),
+    max_pending=int(os.getenv("AUTH_MAX_PENDING", "16")),
+)
+
+def auth_busy():
+    metrics.incr("auth.busy_rejections")
+    return jsonify({"msg": "Too many login attempts in progress, try again later"}), 429, {'Retry-After': '1'}
+
+# Composition job queue: a pool of worker processes sharing one trained model.
+# The model is prepared in the background on the first /compose request.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+compositions = CompositionQueue(
+    training_data_path=os.path.join(BASE_DIR, 'training_data'),
+    cache_path=os.path.join(BASE_DIR, '.cache', 'melody_model.npz'),
+    out_dir=os.path.join(BASE_DIR, 'output', 'jobs'),
+    workers=int(os.getenv("COMPOSE_WORKERS", "2")),
+    max_pending=int(os.getenv("COMPOSE_MAX_PENDING", "32")),
+    max_artifacts=int(os.getenv("COMPOSE_MAX_ARTIFACTS", "5000")),
+)
+
+# Per-route timings for /metrics (only recorded when MUSIC_METRICS=1)
+@app.before_request
+def start_timer():
+    if metrics.enabled():
+        g.request_start = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        metrics.observe(f"http.{request.endpoint}", time.perf_counter() - start)
+        metrics.incr(f"http.status_{response.status_code}")
+    return response
 
 # ✅ Register Route
 @app.route('/register', methods=['POST'])
@@ -28,11 +81,17 @@ def register():
     username = data['username']
     password = data['password']
 
-    if users.find_one({'username': username}):
+    try:
+        hashed = password_hasher.hash(password)
+    except (HasherBusy, TimeoutError):
+        return auth_busy()
+    # One insert; the unique index rejects a taken name, even under a race.
+    try:
+        users.create(username, hashed)
+    except UserExists:
         return jsonify({"msg": "User already exists"}), 409
-
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    users.insert_one({'username': username, 'password': hashed})
+    except UserStoreError:
+        return jsonify({"msg": "User store unavailable"}), 503
 
     return jsonify({"msg": "User registered successfully"}), 201
 
@@ -43,8 +102,15 @@ def login():
     username = data['username']
     password = data['password']
 
-    user = users.find_one({'username': username})
-    if user and bcrypt.checkpw(password.encode('utf-8'), user['password']):
+    try:
+        user = users.find(username)
+    except UserStoreError:
+        return jsonify({"msg": "User store unavailable"}), 503
+    try:
+        valid = user is not None and password_hasher.check(password, user['password'])
+    except (HasherBusy, TimeoutError):
+        return auth_busy()
+    if valid:
         access_token = create_access_token(identity=username)
         return jsonify(access_token=access_token), 200
     return jsonify({"msg": "Invalid credentials"}), 401
@@ -56,6 +122,82 @@ def protected():
     current_user = get_jwt_identity()
     return jsonify(logged_in_as=current_user), 200
 
+# ✅ Compose Route: queues a composition and returns its job id at once
+@app.route('/compose', methods=['POST'])
+@jwt_required()
+def compose():
+    data = request.get_json(silent=True) or {}
+    key_root = str(data.get('key', 'C')).strip().upper()
+    mode = str(data.get('mode', 'major')).strip().lower()
+    export_format = str(data.get('format', 'midi')).strip().lower()
+    try:
+        bars = int(data.get('bars', 4))
+    except (TypeError, ValueError):
+        bars = 0
+    seed = data.get('seed')
+
+    if key_root not in ('C', 'D', 'E', 'F', 'G', 'A', 'B') or mode not in ('major', 'minor'):
+        return jsonify({"msg": "key must be one of C-B and mode major or minor"}), 400
+    if not 1 <= bars <= 64:
+        return jsonify({"msg": "bars must be between 1 and 64"}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"msg": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if seed is not None and (type(seed) is not int or not 0 <= seed < 2 ** 32):
+        return jsonify({"msg": "seed must be an integer between 0 and 2**32 - 1"}), 400
+
+    # A repeated request with the same seed is served from the artifact cache
+    params = {'key': key_root, 'mode': mode, 'bars': bars, 'format': export_format, 'seed': seed}
+    try:
+        job_id = compositions.submit(params, owner=get_jwt_identity())
+    except QueueFull:
+        return jsonify({"msg": "Too many compositions in progress, try again later"}), 429, {'Retry-After': '5'}
+    except RuntimeError as e:
+        return jsonify({"msg": str(e)}), 503
+
+    return jsonify(job_id=job_id, status_url=f"/compose/{job_id}"), 202
+
+# ✅ Job Status Route: poll until status is "done" (or "failed")
+@app.route('/compose/<job_id>', methods=['GET'])
+@jwt_required()
+def compose_status(job_id):
+    job = compositions.status(job_id)
+    if job is None or job['owner'] != get_jwt_identity():
+        return jsonify({"msg": "Job not found"}), 404
+
+    body = {'job_id': job_id, 'status': job['status'], 'params': job['params'], 'error': job['error']}
+    if job['status'] == DONE:
+        result = job['result']
+        body['result'] = {
+            'title': result['title'],
+            'events': result['events'],
+            'seed': result['seed'],
+            'cached': result['cached'],
+            'files': {fmt: f"/compose/{job_id}/{fmt}" for fmt in ('midi', 'musicxml') if fmt in result},
+        }
+    return jsonify(body), 200
+
+# ✅ Job Result Route: downloads a finished job's MIDI or MusicXML file
+@app.route('/compose/<job_id>/<fmt>', methods=['GET'])
+@jwt_required()
+def compose_result(job_id, fmt):
+    job = compositions.status(job_id)
+    if job is None or job['owner'] != get_jwt_identity():
+        return jsonify({"msg": "Job not found"}), 404
+    if job['status'] != DONE or fmt not in ('midi', 'musicxml') or fmt not in job['result']:
+        return jsonify({"msg": "Result not available", "status": job['status']}), 404
+    # Cached files are named by content key; download them under the title
+    path = job['result'][fmt]
+    download_name = job['result']['title'].replace(' ', '_') + os.path.splitext(path)[1]
+    return send_file(path, as_attachment=True, download_name=download_name)
+
+# ✅ Metrics Route: stage timings and counters, including those of finished compose jobs
+@app.route('/metrics', methods=['GET'])
+def metrics_snapshot():
+    data = metrics.snapshot()
+    data['compose_queue'] = {'ready': compositions.ready, 'pending': compositions.pending,
+                             'workers': compositions.workers, 'max_pending': compositions.max_pending}
+    return jsonify(data), 200
+
 # Run server
 if __name__ == '__main__':
     app.run(debug=True)
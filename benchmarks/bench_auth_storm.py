@@ -0,0 +1,122 @@
+"""
+Latency of a non-auth route while /login is being hammered.
+
+Starts app.py's Flask app on a local threaded server, fires concurrent
+logins for a few seconds and meanwhile polls /protected (JWT only, no
+bcrypt), then reports the probe's p50/p99 and how the logins were answered.
+It runs twice: once with a hasher as wide as the storm (every login hashes
+at once, as when bcrypt ran inline on the request thread) and once with the
+bounded defaults.
+
+Users are kept in the in-memory SQLite user store (USER_STORE_URI=sqlite://)
+so the numbers measure the server, not the database.
+
+Usage: python benchmarks/bench_auth_storm.py [--clients 24] [--seconds 5] [--rounds 10]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from common import ROOT_DIR
+
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault('USER_STORE_URI', 'sqlite://')
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app as server
+from password_hasher import PasswordHasher
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def request(base, method, path, body=None, token=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(base + path, data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    if token:
+        req.add_header('Authorization', f'Bearer {token}')
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, json.loads(resp.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else float('nan')
+
+
+def run_storm(base, token, clients, seconds):
+    stop = threading.Event()
+    statuses = Counter()
+    probe_ms = []
+    lock = threading.Lock()
+
+    def storm():
+        while not stop.is_set():
+            status, _ = request(base, 'POST', '/login', {'username': 'storm', 'password': 'secret'})
+            with lock:
+                statuses[status] += 1
+
+    def probe():
+        while not stop.is_set():
+            start = time.perf_counter()
+            request(base, 'GET', '/protected', token=token)
+            probe_ms.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=storm) for _ in range(clients)] + [threading.Thread(target=probe)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return probe_ms, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=24, help='concurrent login clients')
+    parser.add_argument('--seconds', type=float, default=5.0, help='length of each storm')
+    parser.add_argument('--rounds', type=int, default=10, help='bcrypt cost factor')
+    args = parser.parse_args()
+
+    http = make_server('127.0.0.1', 0, server.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{http.server_port}'
+
+    scenarios = [
+        ('unbounded', dict(workers=args.clients, max_pending=args.clients * 4)),
+        ('bounded', dict(workers=2, max_pending=16)),
+    ]
+    print(f"{args.clients} login clients, {args.seconds:.0f}s per storm, bcrypt rounds={args.rounds}")
+    print(f"{'hasher':>10} {'probe p50 ms':>13} {'probe p99 ms':>13} {'probes':>7} "
+          f"{'login 200':>10} {'login 429':>10}")
+    for name, options in scenarios:
+        server.password_hasher = PasswordHasher(rounds=args.rounds, timeout=60, **options)
+        request(base, 'POST', '/register', {'username': 'storm', 'password': 'secret'})
+        _, body = request(base, 'POST', '/login', {'username': 'storm', 'password': 'secret'})
+        token = body['access_token']
+
+        probe_ms, statuses = run_storm(base, token, args.clients, args.seconds)
+        print(f"{name:>10} {percentile(probe_ms, 50):>13.1f} {percentile(probe_ms, 99):>13.1f} "
+              f"{len(probe_ms):>7} {statuses[200]:>10} {statuses[429]:>10}")
+        server.password_hasher.shutdown()
+    http.shutdown()
+
+
+if __name__ == '__main__':
+    main()
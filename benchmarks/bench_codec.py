@@ -0,0 +1,91 @@
+"""
+Size and speed of the binary composition encoding versus JSON text.
+
+--crossover also times the plain and the NumPy melody decoder at a range of
+sizes, to place composition_codec.DECODE_VECTORIZE_MIN_EVENTS.
+
+Usage:
+    python benchmarks/bench_codec.py [--repeats 200] [--crossover]
+"""
+
+import argparse
+import json
+import random
+import time
+
+import common
+import composition_codec
+from composition_codec import decode_melody, encode_melody
+
+SIZES = (32, 256, 4096)
+
+
+def corpus_melody(sequences, length, rng):
+    """A slice of real (pitch, delta) events from the training corpus."""
+    long_enough = [s for s in sequences if len(s) >= length]
+    events = rng.choice(long_enough)
+    start = rng.randrange(len(events) - length + 1)
+    return [tuple(e) for e in events[start:start + length]]
+
+
+def per_call(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def bench_size(melody, repeats):
+    formats = {
+        'json': (lambda: json.dumps(melody).encode('utf-8'), lambda d: json.loads(d)),
+        'binary': (lambda: encode_melody(melody, compress=False), decode_melody),
+        'binary+zlib': (lambda: encode_melody(melody, compress=True), decode_melody),
+    }
+    results = {}
+    for name, (encode, decode) in formats.items():
+        data = encode()
+        results[name] = {
+            'bytes': len(data),
+            'encode_us': per_call(encode, repeats) * 1e6,
+            'decode_us': per_call(lambda: decode(data), repeats) * 1e6,
+        }
+    return results
+
+
+def bench_crossover(sequences, repeats, rng):
+    """Decode time of the plain loop and the NumPy path per melody length."""
+    threshold = composition_codec.DECODE_VECTORIZE_MIN_EVENTS
+    print(f"\n{'events':>6} {'loop us':>9} {'numpy us':>9}")
+    try:
+        for size in (32, 64, 96, 128, 192, 256, 512, 1024):
+            data = encode_melody(corpus_melody(sequences, size, rng), compress=False)
+            times = []
+            for forced in (size + 1, 0):        # loop, then NumPy
+                composition_codec.DECODE_VECTORIZE_MIN_EVENTS = forced
+                times.append(per_call(lambda: decode_melody(data), repeats) * 1e6)
+            print(f"{size:>6} {times[0]:>9.1f} {times[1]:>9.1f}")
+    finally:
+        composition_codec.DECODE_VECTORIZE_MIN_EVENTS = threshold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--crossover', action='store_true',
+                        help='also time the loop and NumPy decoders by melody length')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sequences = common.read_corpus()
+    print(f"{'events':>6} {'format':>12} {'bytes':>8} {'B/event':>8} {'encode us':>10} {'decode us':>10}")
+    for size in SIZES:
+        melody = corpus_melody(sequences, size, rng)
+        for name, r in bench_size(melody, args.repeats).items():
+            print(f"{size:>6} {name:>12} {r['bytes']:>8} {r['bytes'] / size:>8.2f} "
+                  f"{r['encode_us']:>10.1f} {r['decode_us']:>10.1f}")
+    if args.crossover:
+        bench_crossover(sequences, args.repeats, rng)
+
+
+if __name__ == '__main__':
+    main()
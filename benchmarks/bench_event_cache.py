@@ -0,0 +1,64 @@
+"""
+Training time with and without the per-file event cache.
+
+Trains on the corpus three times: without a cache, with an empty cache
+(parse and fill it) and with a warm cache. A fourth run changes one file
+to show that only that file is parsed again.
+
+Usage:
+    python benchmarks/bench_event_cache.py [--corpus training_data]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+
+from mido import MidiFile
+
+import common
+import metrics
+from melody_generator import MelodyGenerator
+
+
+def train(folder, cache_dir):
+    """Trains a fresh generator; returns (seconds, files parsed, duplicates skipped)."""
+    generator = MelodyGenerator(event_cache_dir=cache_dir)
+    metrics.reset()
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()), common.timed(results, 'seconds'):
+        generator.train(folder)
+    counters = metrics.snapshot()['counters']
+    return results['seconds'], counters.get('train.files_parsed', 0), counters.get('train.duplicates_skipped', 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=common.TRAINING_DATA)
+    args = parser.parse_args()
+    metrics.enable()
+
+    with tempfile.TemporaryDirectory(prefix='music_events_') as workdir:
+        corpus = os.path.join(workdir, 'corpus')
+        shutil.copytree(args.corpus, corpus)
+        cache_dir = os.path.join(workdir, 'events')
+
+        print(f"{'run':<16} {'seconds':>8} {'parsed':>7} {'duplicates':>11}")
+        runs = [('no cache', None), ('cold cache', cache_dir), ('warm cache', cache_dir)]
+        for name, cache in runs:
+            seconds, parsed, duplicates = train(corpus, cache)
+            print(f"{name:<16} {seconds:>8.3f} {parsed:>7} {duplicates:>11}")
+
+        # Append a copy of the first track to one file: a new hash, so it alone is parsed
+        first = sorted(f for f in os.listdir(corpus) if f.lower().endswith(('.mid', '.midi')))[0]
+        midi = MidiFile(os.path.join(corpus, first))
+        midi.tracks.append(midi.tracks[-1].copy())
+        midi.save(os.path.join(corpus, first))
+        seconds, parsed, duplicates = train(corpus, cache_dir)
+        print(f"{'one file edited':<16} {seconds:>8.3f} {parsed:>7} {duplicates:>11}")
+
+
+if __name__ == '__main__':
+    main()
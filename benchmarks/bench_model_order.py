@@ -0,0 +1,54 @@
+"""
+Memory and time of the Markov model for each context order.
+
+Usage:
+    python benchmarks/bench_model_order.py [--max-order 4] [--corpus training_data]
+"""
+
+import argparse
+import random
+
+import common
+from markov_chain import MarkovChain
+from melody_generator import MelodyGenerator
+
+
+def bench_order(sequences, order, length=256, repeats=50):
+    results = {'order': order}
+    with common.peak_memory(results, 'build_peak_bytes'):
+        with common.timed(results, 'build_s'):
+            chain = MarkovChain.from_sequences(sequences, order=order)
+    results['contexts'] = chain.context_sizes()
+    results['model_bytes'] = chain.nbytes()
+
+    generator = MelodyGenerator(order=order)
+    generator.chain = chain
+    random.seed(0)
+    with common.timed(results, 'generate_s'):
+        for _ in range(repeats):
+            generator.generate(length, key='C')
+    results['generate_s'] /= repeats
+    with common.timed(results, 'generate_batch_s'):
+        generator.generate_batch(repeats, length, key='C', seed=0)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--max-order', type=int, default=4)
+    parser.add_argument('--corpus', default=common.TRAINING_DATA)
+    args = parser.parse_args()
+
+    sequences = common.read_corpus(args.corpus)
+    print(f"{sum(len(s) for s in sequences)} events from {len(sequences)} files\n")
+    print(f"{'order':>5} {'contexts':>10} {'model KiB':>10} {'peak KiB':>10} "
+          f"{'build ms':>9} {'gen ms':>8} {'batch ms':>9}")
+    for order in range(1, args.max_order + 1):
+        r = bench_order(sequences, order)
+        print(f"{r['order']:>5} {sum(r['contexts']):>10} {r['model_bytes'] / 1024:>10.0f} "
+              f"{r['build_peak_bytes'] / 1024:>10.0f} {r['build_s'] * 1e3:>9.1f} "
+              f"{r['generate_s'] * 1e3:>8.2f} {r['generate_batch_s'] * 1e3:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
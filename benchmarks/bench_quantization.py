@@ -0,0 +1,93 @@
+"""
+State count, memory and sampling of the raw-tick vs quantized event models.
+
+"raw" is the original extraction: (note, msg.time) for every note_on, with
+msg.time in the file's own ticks. "ticks" keeps exact timing: onset gap
+and note_off-paired duration in ticks. "quantized" is the current one:
+(pitch, rhythm code) with the same gap and duration normalised to beats
+and snapped to the rhythm grid (src/rhythm.py).
+
+Usage:
+    python benchmarks/bench_quantization.py [--corpus training_data] [--orders 1,2,3]
+"""
+
+import argparse
+import os
+import random
+import time
+
+from mido import MidiFile
+
+import common
+import metrics
+from markov_chain import MarkovChain
+from melody_generator import MelodyGenerator, _read_midi_events, _track_notes
+
+
+def read_raw(path):
+    """The original event extraction, kept here for comparison."""
+    events = []
+    for track in MidiFile(path).tracks:
+        for msg in track:
+            if msg.type == 'note_on' and msg.velocity > 0:
+                events.append((msg.note, msg.time))
+    return events
+
+
+def read_ticks(path):
+    """Rhythm-aware events without quantization: gap and duration in raw ticks, packed."""
+    events = []
+    for track in MidiFile(path).tracks:
+        pitches, onsets, releases = _track_notes(track)
+        for i, pitch in enumerate(pitches):
+            gap = onsets[i] - onsets[i - 1] if i else 0
+            events.append((pitch, min(gap, 0xFFFF) << 16 | min(releases[i] - onsets[i], 0xFFFF)))
+    return events
+
+
+def measure(sequences, order, steps=20000):
+    chain = MarkovChain.from_sequences(sequences, order=order)
+    generator = MelodyGenerator(order=order)
+    generator.chain = chain
+    metrics.reset()
+    random.seed(0)
+    start = time.perf_counter()
+    generator.generate(steps, key='C')
+    seconds = time.perf_counter() - start
+    dead_ends = metrics.snapshot()['counters'].get('generate.dead_ends', 0)
+    return {
+        'states': len(chain.events),
+        'contexts': sum(chain.context_sizes()),
+        'transitions': sum(len(table.successors) for table in chain.tables),
+        'model_kib': chain.nbytes() / 1024,
+        'us_per_event': seconds / steps * 1e6,
+        'dead_ends_per_1k': dead_ends / steps * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=common.TRAINING_DATA)
+    parser.add_argument('--orders', default='1,2,3')
+    args = parser.parse_args()
+    metrics.enable()
+
+    paths = [os.path.join(args.corpus, name) for name in sorted(os.listdir(args.corpus))
+             if name.lower().endswith(('.mid', '.midi'))]
+    corpora = {
+        'raw': [read_raw(path) for path in paths],
+        'ticks': [read_ticks(path) for path in paths],
+        'quantized': [_read_midi_events(path).events for path in paths],
+    }
+    print(f"{len(paths)} files, {sum(len(s) for s in corpora['raw'])} note events\n")
+    print(f"{'model':<10} {'order':>5} {'states':>8} {'contexts':>9} {'transitions':>12} "
+          f"{'model KiB':>10} {'us/event':>9} {'dead ends/1k':>13}")
+    for order in [int(o) for o in args.orders.split(',')]:
+        for name, sequences in corpora.items():
+            r = measure(sequences, order)
+            print(f"{name:<10} {order:>5} {r['states']:>8} {r['contexts']:>9} {r['transitions']:>12} "
+                  f"{r['model_kib']:>10.0f} {r['us_per_event']:>9.2f} {r['dead_ends_per_1k']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
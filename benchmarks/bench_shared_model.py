@@ -0,0 +1,96 @@
+"""
+Per-worker memory and start-up time: private model copies vs the shared mapped model.
+
+Starts --workers fresh processes that each either load the .npz model
+cache (a private copy per process) or attach the shared model folder
+(`model_store.attach_shared`), generate one melody, and report how long
+the model took to load and how much private memory (Linux smaps
+Private_Clean + Private_Dirty) the model added to the process. Mapped
+pages shared through the page cache are not private, so they do not grow
+with the worker count.
+
+Usage:
+    python benchmarks/bench_shared_model.py [--workers 4] [--order 3] [--scale 4]
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+
+import common
+from melody_generator import MelodyGenerator
+from model_store import attach_shared, load_model, save_model, save_shared
+
+
+def private_bytes():
+    """Private (unshared) memory of this process, in bytes."""
+    total = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def worker(mode, path, order, queue):
+    import random
+    import time
+
+    generator = MelodyGenerator(order=order)
+    before = private_bytes()
+    start = time.perf_counter()
+    ok = load_model(generator, path, None) if mode == "private" else attach_shared(generator, path)
+    load_s = time.perf_counter() - start
+    random.seed(0)
+    generator.generate(256, key="C", temperature=1.2)
+    queue.put((ok, load_s, private_bytes() - before))
+
+
+def run(mode, path, order, workers):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, path, order, queue)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    if not all(ok for ok, _, _ in results):
+        raise RuntimeError(f"{mode} model did not load")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--scale", type=int, default=4, help="synthetic corpus size, in bundled corpora")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="music_shared_") as workdir:
+        corpus = os.path.join(workdir, "corpus")
+        bundled = len([f for f in os.listdir(common.TRAINING_DATA) if f.lower().endswith((".mid", ".midi"))])
+        common.write_synthetic_corpus(corpus, bundled * args.scale)
+        generator = MelodyGenerator(order=args.order)
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator.train(corpus)
+        npz_path = os.path.join(workdir, "model.npz")
+        shared_path = os.path.join(workdir, "model.shared")
+        save_model(generator, npz_path, [])
+        save_shared(generator, shared_path, temperatures=(1.0, 1.2))
+        print(f"order {args.order}, model arrays {generator.chain.nbytes() / 2**20:.1f} MiB, "
+              f"{args.workers} workers\n")
+
+        print(f"{'mode':<8} {'load ms (mean)':>15} {'private MiB / worker':>21} {'total MiB':>10}")
+        for mode, path in (("private", npz_path), ("shared", shared_path)):
+            results = run(mode, path, args.order, args.workers)
+            load_ms = sum(s for _, s, _ in results) / len(results) * 1e3
+            private = [b / 2**20 for _, _, b in results]
+            print(f"{mode:<8} {load_ms:>15.1f} {sum(private) / len(private):>21.1f} {sum(private):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
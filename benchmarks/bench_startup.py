@@ -0,0 +1,79 @@
+"""
+Import-time budget for the entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+the CLI, the web app and the composition worker, and reports the
+cumulative import time of each (best of --repeat runs) with its heaviest
+dependencies. Exits with status 1 if any entry point is over its budget or
+imports a module that should only load on first use (music21, pymongo), so
+it can guard against startup regressions in CI.
+
+Usage: python benchmarks/bench_startup.py [--repeat 3] [--scale 1.0]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from common import ROOT_DIR, SRC_DIR
+
+# (name, module, working directory, budget in ms)
+ENTRY_POINTS = [
+    ("cli", "main", SRC_DIR, 400),
+    ("web", "app", ROOT_DIR, 800),
+    ("worker", "composition_jobs", SRC_DIR, 400),
+]
+
+# Heavy packages that must not be imported until they are actually used.
+LAZY_MODULES = ("music21", "pymongo")
+
+
+def import_times(module, cwd):
+    """Runs one cold import and returns {module: (self_us, cumulative_us)}."""
+    env = dict(os.environ, USER_STORE_URI="sqlite://")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=cwd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="cold imports per entry point")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    args = parser.parse_args()
+
+    failures = []
+    for name, module, cwd, budget_ms in ENTRY_POINTS:
+        runs = [import_times(module, cwd) for _ in range(args.repeat)]
+        best = min(runs, key=lambda times: times[module][1])
+        total_ms = best[module][1] / 1000
+        budget_ms *= args.scale
+        status = "ok" if total_ms <= budget_ms else "OVER BUDGET"
+        print(f"{name:>7} (import {module}): {total_ms:7.1f} ms  budget {budget_ms:6.0f} ms  {status}")
+
+        top_level = {mod: t for mod, t in best.items() if "." not in mod and mod != module}
+        heaviest = sorted(top_level.items(), key=lambda item: -item[1][1])[:5]
+        print("         heaviest: " + ", ".join(f"{mod} {t[1] / 1000:.0f} ms" for mod, t in heaviest))
+
+        eager = sorted({mod.split(".")[0] for mod in best} & set(LAZY_MODULES))
+        if eager:
+            failures.append(f"{name} imports {', '.join(eager)} at startup")
+        if total_ms > budget_ms:
+            failures.append(f"{name} takes {total_ms:.0f} ms to import (budget {budget_ms:.0f} ms)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Throughput and race checks for the user store.
+
+1. Sign-up race: many threads register the same name at once; exactly one
+   may succeed, the rest must get UserExists.
+2. Inserts: distinct users registered from several threads.
+3. Lookups: random existing users fetched from several threads.
+
+Runs against the in-process SQLite stand-in by default; pass a MongoDB URI
+to measure a real server (it writes to a separate database, see --db).
+
+Usage: python benchmarks/bench_user_store.py [--uri sqlite://] [--threads 8] [--users 2000]
+"""
+
+import argparse
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import common  # noqa: F401  (puts src/ on the path)
+from user_store import open_user_store, UserExists
+
+
+def signup_race(store, threads):
+    name = f"race-{uuid.uuid4().hex[:8]}"
+    barrier = threading.Barrier(threads)
+    outcomes = []
+
+    def register():
+        barrier.wait()
+        try:
+            store.create(name, b"hash")
+            outcomes.append("created")
+        except UserExists:
+            outcomes.append("exists")
+
+    workers = [threading.Thread(target=register) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return outcomes.count("created"), outcomes.count("exists")
+
+
+def timed_calls(fn, args, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(fn, args))
+    return len(args) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--uri', default='sqlite://', help='user store URI')
+    parser.add_argument('--db', default='music_app_bench', help='MongoDB database to use')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    options = {} if args.uri.startswith('sqlite:') else {'db_name': args.db, 'max_pool_size': args.threads}
+    store = open_user_store(args.uri, **options)
+    store.ensure_indexes()
+
+    created, exists = signup_race(store, args.threads * 4)
+    print(f"sign-up race ({args.threads * 4} threads, one name): "
+          f"{created} created, {exists} rejected -> {'ok' if created == 1 else 'RACE'}")
+
+    prefix = uuid.uuid4().hex[:8]
+    names = [f"{prefix}-{i}" for i in range(args.users)]
+    rate = timed_calls(lambda name: store.create(name, b"hash"), names, args.threads)
+    print(f"inserts: {rate:,.0f}/s ({args.users} users, {args.threads} threads)")
+
+    lookups = [random.choice(names) for _ in range(args.users * 5)]
+    rate = timed_calls(store.find, lookups, args.threads)
+    print(f"lookups: {rate:,.0f}/s ({len(lookups)} finds, {args.threads} threads)")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
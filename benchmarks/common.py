@@ -0,0 +1,75 @@
+"""
+Shared helpers for the benchmark scripts.
+Importing this module puts `src/` on the import path, the same way the
+scripts in `src/` import each other.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+TRAINING_DATA = os.path.join(ROOT_DIR, "training_data")
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+@contextmanager
+def timed(results, name):
+    """Stores the wall time of the block, in seconds, as results[name]."""
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+@contextmanager
+def peak_memory(results, name):
+    """Stores the peak Python allocation of the block, in bytes, as results[name]."""
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        results[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+
+def read_corpus(folder=TRAINING_DATA):
+    """Parses every MIDI file in `folder` once and returns the per-file event lists."""
+    from melody_generator import MelodyGenerator
+
+    generator = MelodyGenerator()
+    paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+             if name.lower().endswith(('.mid', '.midi'))]
+    return [result.events for result in generator._read_files(paths)]
+
+
+def write_synthetic_corpus(folder, files, events_per_file=2200, seed=0):
+    """
+    Writes `files` random-walk melodies as MIDI files into `folder`, for
+    scaling benchmarks past the bundled corpus (which averages about 2200
+    note events per file). The same seed always writes the same corpus.
+
+    Returns:
+        int: Total number of note events written.
+    """
+    import random
+
+    from mido import Message, MidiFile, MidiTrack
+
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(files):
+        track = MidiTrack()
+        pitch = rng.randint(55, 72)
+        for _ in range(events_per_file):
+            pitch = min(96, max(36, pitch + rng.choice((-4, -2, -1, 0, 1, 2, 3, 5))))
+            track.append(Message('note_on', note=pitch, velocity=80, time=rng.choice((0, 120, 240, 480))))
+            track.append(Message('note_off', note=pitch, velocity=0, time=rng.choice((0, 120, 240))))
+        mid = MidiFile()
+        mid.tracks.append(track)
+        mid.save(os.path.join(folder, f"synthetic_{i:05d}.mid"))
+    return files * events_per_file
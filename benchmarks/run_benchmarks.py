@@ -0,0 +1,314 @@
+"""
+Benchmark suite: training, generation, chord building, export and database I/O.
+
+Runs on the bundled training_data corpus and on synthetic corpora scaled up
+from it. Every metric is stored with its unit and with whether higher or
+lower is better, and each run is written as JSON so runs can be compared:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    ...change something...
+    python benchmarks/run_benchmarks.py --output after.json --baseline before.json
+
+With --baseline, metrics that got worse by more than --threshold are
+listed and the exit status is 1.
+
+Usage: python benchmarks/run_benchmarks.py [--quick] [--only train,generate,chords,export,db]
+           [--scales 4,16] [--output FILE] [--baseline FILE] [--threshold 0.15]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import common
+
+SUITES = ("train", "generate", "chords", "export", "db")
+RESULTS_DIR = os.path.join(common.ROOT_DIR, "benchmarks", "results")
+
+# Tonics of all 24 major and minor keys (minor keys are written lower-case).
+TONICS = ("C", "C#", "D", "E-", "E", "F", "F#", "G", "A-", "A", "B-", "B")
+
+
+# -------------------------------
+# Harness
+# -------------------------------
+class Results:
+    """Metrics of one run, by dotted name."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better):
+        self.metrics[name] = {"value": value, "unit": unit, "better": better}
+        print(f"  {name:<44} {value:>14,.3f} {unit}")
+
+
+def median_time(fn, repeat):
+    """Median wall time of `repeat` calls to fn(), in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Hides the status prints of the code being measured."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@lru_cache(maxsize=None)
+def bundled_generator():
+    from melody_generator import MelodyGenerator
+
+    generator = MelodyGenerator()
+    with quiet():
+        generator.train(common.TRAINING_DATA)
+    return generator
+
+
+def sample_melody(length, seed=0):
+    random.seed(seed)
+    return bundled_generator().generate(length, key="C")
+
+
+# -------------------------------
+# Suites
+# -------------------------------
+def bench_train(results, args, workdir):
+    from melody_generator import MelodyGenerator
+
+    corpora = [("bundled", common.TRAINING_DATA)]
+    bundled_files = len([f for f in os.listdir(common.TRAINING_DATA) if f.lower().endswith((".mid", ".midi"))])
+    for scale in args.scales:
+        folder = os.path.join(workdir, f"synthetic_x{scale}")
+        common.write_synthetic_corpus(folder, bundled_files * scale, seed=scale)
+        corpora.append((f"synthetic_x{scale}", folder))
+
+    for name, folder in corpora:
+        generator = MelodyGenerator()
+
+        def train():
+            with quiet():
+                generator.train(folder)
+
+        seconds = median_time(train, args.repeat_slow)
+        files = len(generator.file_events)
+        events = sum(len(e) for e in generator.file_events.values())
+        results.add(f"train.{name}.seconds", seconds, "s", "lower")
+        results.add(f"train.{name}.files_per_s", files / seconds, "files/s", "higher")
+        results.add(f"train.{name}.events_per_s", events / seconds, "events/s", "higher")
+
+
+def bench_generate(results, args, workdir):
+    generator = bundled_generator()
+    for length in (16, 64, 256, 1024, 4096):
+        random.seed(0)
+        seconds = median_time(lambda: generator.generate(length, key="C"), args.repeat)
+        results.add(f"generate.length_{length}.latency_ms", seconds * 1e3, "ms", "lower")
+    seconds = median_time(lambda: generator.generate_batch(64, 256, key="C", seed=0), args.repeat)
+    results.add("generate.batch_64x256.latency_ms", seconds * 1e3, "ms", "lower")
+
+
+def bench_chords(results, args, workdir):
+    from chord_generator import chord_progression, chord_vocabulary, generate_chords
+
+    keys = [(tonic, "major") for tonic in TONICS] + [(tonic.lower(), "minor") for tonic in TONICS]
+    generate_chords("C", "major", 4)    # load music21 outside the timings
+
+    def all_progressions():
+        for key_name, mode in keys:
+            chord_progression(key_name, mode, 8)
+
+    def cold_progressions():
+        chord_vocabulary.cache_clear()
+        chord_progression.cache_clear()
+        all_progressions()
+
+    def all_streams():
+        for key_name, mode in keys:
+            generate_chords(key_name, mode, 8)
+
+    results.add("chords.progression_all_keys_cold.ms", median_time(cold_progressions, args.repeat) * 1e3,
+                "ms", "lower")
+    results.add("chords.progression_all_keys_warm.ms", median_time(all_progressions, args.repeat) * 1e3,
+                "ms", "lower")
+    results.add("chords.generate_chords_all_keys.ms", median_time(all_streams, args.repeat) * 1e3,
+                "ms", "lower")
+
+
+def bench_export(results, args, workdir):
+    from chord_generator import chord_progression, generate_chords
+    from composer import build_score
+    from utils import export_midi
+
+    bars = 32
+    melody = sample_melody(bars * 8)
+    progression = chord_progression("C", "major", bars)
+    path = os.path.join(workdir, "export.mid")
+
+    def via_music21():
+        with quiet():
+            score = build_score(melody, generate_chords("C", "major", bars), "Benchmark")
+            score.write("midi", fp=path)
+
+    music21_s = median_time(via_music21, args.repeat_slow)
+    direct_s = median_time(lambda: export_midi(melody, progression, path, title="Benchmark"), args.repeat)
+    results.add(f"export.music21_{bars}_bars.ms", music21_s * 1e3, "ms", "lower")
+    results.add(f"export.direct_midi_{bars}_bars.ms", direct_s * 1e3, "ms", "lower")
+    results.add("export.direct_speedup", music21_s / direct_s, "x", "higher")
+
+    # Full compose of both formats, rendered in turn, vs answered by the artifact cache
+    from artifact_cache import ArtifactCache
+    from composer import compose
+
+    generator = bundled_generator()
+    cache = ArtifactCache(os.path.join(workdir, "artifacts"))
+    render_s = median_time(lambda: compose(generator, "C", "major", bars, "both", workdir), args.repeat_slow)
+    compose(generator, "C", "major", bars, "both", workdir, seed=0, cache=cache)
+    cached_s = median_time(lambda: compose(generator, "C", "major", bars, "both", workdir, seed=0, cache=cache),
+                           args.repeat)
+    results.add(f"export.compose_both_{bars}_bars.ms", render_s * 1e3, "ms", "lower")
+    results.add(f"export.compose_cached_{bars}_bars.ms", cached_s * 1e3, "ms", "lower")
+
+
+def bench_db(results, args, workdir):
+    import database_manager
+
+    database_manager.DATABASE_NAME = os.path.join(workdir, "bench_compositions.db")
+    melody = sample_melody(256)
+    chords = ["I", "vi", "IV", "V"] * 8
+    single, bulk = (50, 1000) if args.quick else (200, 5000)
+    try:
+        with quiet():
+            database_manager.create_database()
+            start = time.perf_counter()
+            for i in range(single):
+                database_manager.save_composition(f"single {i}", melody, chords, "C")
+            single_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            database_manager.save_compositions((f"bulk {i}", melody, chords, "C") for i in range(bulk))
+            bulk_s = time.perf_counter() - start
+        results.add("db.insert_single.rows_per_s", single / single_s, "rows/s", "higher")
+        results.add("db.insert_bulk.rows_per_s", bulk / bulk_s, "rows/s", "higher")
+
+        total = single + bulk
+
+        def walk_pages():
+            cursor, rows = None, 0
+            while True:
+                page, cursor = database_manager.list_compositions(limit=50, cursor=cursor)
+                rows += len(page)
+                if cursor is None:
+                    return rows
+
+        seconds = median_time(walk_pages, args.repeat)
+        results.add("db.list_pages.rows_per_s", total / seconds, "rows/s", "higher")
+        seconds = median_time(database_manager.load_all_compositions, args.repeat)
+        results.add("db.load_all.rows_per_s", total / seconds, "rows/s", "higher")
+        seconds = median_time(lambda: sum(1 for _ in database_manager.iter_compositions()), args.repeat_slow)
+        results.add("db.iter_with_data.rows_per_s", total / seconds, "rows/s", "higher")
+    finally:
+        database_manager.close_connections()
+
+
+# -------------------------------
+# Baseline comparison
+# -------------------------------
+def compare(metrics, baseline, threshold):
+    """Prints the change of every metric present in both runs; returns the regressions."""
+    regressions = []
+    print(f"\n{'metric':<46} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, metric in metrics.items():
+        old = baseline.get(name)
+        if old is None or not old["value"]:
+            continue
+        change = metric["value"] / old["value"] - 1
+        worse = change > threshold if metric["better"] == "lower" else change < -threshold
+        flag = "  WORSE" if worse else ""
+        print(f"{name:<46} {old['value']:>12,.3f} {metric['value']:>12,.3f} {change:>+8.1%}{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=common.ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and one small synthetic corpus")
+    parser.add_argument("--only", default=",".join(SUITES), help="comma-separated suites to run")
+    parser.add_argument("--scales", default=None,
+                        help="synthetic corpus sizes, as multiples of the bundled corpus (default 4,16)")
+    parser.add_argument("--output", default=None, help="JSON file to write (default benchmarks/results/<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier JSON run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    args.scales = [int(s) for s in (args.scales or ("2" if args.quick else "4,16")).split(",") if s]
+    args.repeat = 3 if args.quick else 7
+    args.repeat_slow = 1 if args.quick else 3
+    suites = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    results = Results()
+    with tempfile.TemporaryDirectory(prefix="music_bench_") as workdir:
+        for suite in suites:
+            print(f"[{suite}]")
+            globals()[f"bench_{suite}"](results, args, workdir)
+
+    run = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+            "scales": args.scales,
+            "suites": suites,
+        },
+        "metrics": results.metrics,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(results.metrics, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metrics worse than the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
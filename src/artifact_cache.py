@@ -0,0 +1,131 @@
+"""
+Artifact Cache Module
+---------------------
+Content-addressed store for finished compositions. A composition is fully
+determined by the model it was sampled from, its seed and its parameters,
+so those are hashed into a key and every exported file is stored under that
+key:
+
+    <directory>/<key[:2]>/<key>.json    title, event count, seed
+    <directory>/<key[:2]>/<key>.mid     MIDI (melody and chords)
+    <directory>/<key[:2]>/<key>.mxl     MusicXML, if it was ever requested
+
+An identical request is answered with the stored files instead of being
+generated and written again. Files are written under a temporary name and
+renamed into place, so readers never see a partial file and two workers
+producing the same key at once simply write the same bytes.
+
+With `max_entries`, the cache is bounded: a hit refreshes the entry's
+metadata file time, and every `prune_every` writes (a tenth of the limit
+by default) the least recently used entries beyond the limit are removed.
+Requests without a seed draw a new one each time and so almost never
+repeat; without a bound they would fill the folder forever. Pruning walks
+the whole folder, so it is spread out rather than done on every write;
+keep one ArtifactCache per process so its write count carries over, and
+the folder overshoots the limit by at most `prune_every` per process.
+"""
+
+import hashlib
+import json
+import os
+
+
+class ArtifactCache:
+    """
+    A folder of composition files named by content key.
+
+    Args:
+        directory (str): Cache folder.
+        max_entries (int): Most compositions kept; None keeps everything.
+        prune_every (int): Writes between two prunes; defaults to a tenth
+            of `max_entries`.
+    """
+
+    def __init__(self, directory, max_entries=None, prune_every=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        if prune_every is None and max_entries is not None:
+            prune_every = max(1, max_entries // 10)
+        self.prune_every = prune_every
+        self._puts = 0
+
+    @staticmethod
+    def key(**fields):
+        """Hex SHA-256 of the given fields (JSON-serialisable values)."""
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def lookup(self, key, suffixes):
+        """
+        Returns the stored metadata and file paths for a key.
+
+        Returns:
+            tuple: (metadata dict or None, {suffix: path} of the files present).
+        """
+        try:
+            with open(self.path(key, '.json')) as f:
+                meta = json.load(f)
+            os.utime(self.path(key, '.json'))       # recently used, evicted last
+        except (OSError, ValueError):
+            meta = None
+        found = {suffix: self.path(key, suffix) for suffix in suffixes
+                 if os.path.exists(self.path(key, suffix))}
+        return meta, found
+
+    def put_meta(self, key, meta):
+        """Stores a key's metadata (written atomically); every `prune_every` calls, evicts beyond `max_entries`."""
+        path = self.path(key, '.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+        if self.max_entries is not None:
+            self._puts += 1
+            if self._puts >= self.prune_every:
+                self._puts = 0
+                self.prune(self.max_entries)
+
+    def prune(self, max_entries):
+        """
+        Removes the least recently used compositions until at most
+        `max_entries` remain. Several processes may prune at once; a file
+        another one removed first is skipped.
+
+        Returns:
+            int: Compositions removed.
+        """
+        entries = {}                # key -> [last used, file paths]
+        try:
+            shards = [e.path for e in os.scandir(self.directory) if e.is_dir()]
+        except OSError:
+            return 0
+        for shard in shards:
+            try:
+                files = list(os.scandir(shard))
+            except OSError:
+                continue
+            for f in files:
+                if f.name.startswith('.') or f.name.endswith('.tmp'):
+                    continue        # being written right now
+                try:
+                    mtime = f.stat().st_mtime
+                except OSError:
+                    continue
+                entry = entries.setdefault(f.name.split('.', 1)[0], [0.0, []])
+                entry[0] = max(entry[0], mtime)
+                entry[1].append(f.path)
+        excess = len(entries) - max_entries
+        if excess <= 0:
+            return 0
+        for _, paths in sorted(entries.values())[:excess]:
+            # Metadata first, so a concurrent lookup misses instead of
+            # finding an entry whose files are going away.
+            for path in sorted(paths, key=lambda p: not p.endswith('.json')):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return excess
@@ -3,12 +3,23 @@ Chord Generator Module
 ----------------------
 Generates chord progressions for a given key and mode.
 Also provides helper to open outputs directly in MuseScore.
+
+The triads of each key are spelled from a small scale table (see
+music_theory) and cached as lightweight ChordSpec tuples. music21 is only
+imported, and its Chord objects built, when a stream is actually requested.
 """
 
 import os, platform, subprocess
+from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
-from music21 import stream, chord, key, tempo
-import copy
+
+from music_theory import scale_degrees
+
+# Immutable chord description: root and pitches as MIDI numbers, the
+# spelled pitch names (e.g. "F#4") for rebuilding music21 objects, and the
+# roman numeral (None when it should not be shown as a lyric).
+ChordSpec = namedtuple("ChordSpec", ["root", "pitches", "names", "numeral"])
 
 # -------------------------------
 # Helper to open outputs
@@ -50,7 +61,14 @@ def open_outputs(midi_path: str, xml_path: str):
 # -------------------------------
 # Chord triads
 # -------------------------------
+# Scale degrees of each triad, root first, in the order music21 is given them.
+TRIAD_DEGREES = {
+    "major": (("I", (1, 3, 5)), ("IV", (4, 6, 1)), ("V", (5, 7, 2)), ("vi", (6, 1, 3))),
+    "minor": (("i", (1, 3, 5)), ("iv", (4, 6, 1)), ("v", (5, 7, 2)), ("VI", (6, 1, 3))),
+}
+
 def get_major_triads(scale_obj):
+    from music21 import chord
     return {
         "I": chord.Chord([scale_obj.pitchFromDegree(1),
                           scale_obj.pitchFromDegree(3),
@@ -67,6 +85,7 @@ def get_major_triads(scale_obj):
     }
 
 def get_minor_triads(scale_obj):
+    from music21 import chord
     return {
         "i": chord.Chord([scale_obj.pitchFromDegree(1),
                           scale_obj.pitchFromDegree(3),
@@ -83,32 +102,63 @@ def get_minor_triads(scale_obj):
     }
 
 # -------------------------------
-# Chord progression generator
+# Cached chord vocabulary
 # -------------------------------
-def generate_chords(key_name="C", mode="major", num_bars=4):
-    k = key.Key(key_name, mode)
+@lru_cache(maxsize=64)
+def chord_vocabulary(key_name="C", mode="major"):
+    """
+    The triads used for a key, as a tuple of ChordSpecs (tonic first).
+    Spelled like music21's Key.pitchFromDegree, without importing music21.
+    """
+    mode = "major" if mode.lower() == "major" else "minor"
+    degrees = scale_degrees(key_name, mode)
+    specs = []
+    for numeral, triad in TRIAD_DEGREES[mode]:
+        names, pitches = zip(*(degrees[d - 1] for d in triad))
+        specs.append(ChordSpec(root=pitches[0], pitches=pitches, names=names, numeral=numeral))
+    return tuple(specs)
+
+
+@lru_cache(maxsize=1024)
+def chord_progression(key_name="C", mode="major", num_bars=4):
+    """The chord for each bar, as a tuple of ChordSpecs."""
+    vocabulary = {spec.numeral: spec for spec in chord_vocabulary(key_name, mode)}
 
     if mode.lower() == "major":
-        chords_dict = get_major_triads(k)
         templates = [["I", "vi", "IV", "V"], ["I", "IV", "V", "I"]]
     else:
-        chords_dict = get_minor_triads(k)
         templates = [["i", "VI", "iv", "V"], ["i", "iv", "V", "i"]]
 
     template = templates[0]
-    chord_stream = stream.Stream()
-    chord_stream.append(tempo.MetronomeMark(number=100))
-
+    progression = []
     for i in range(num_bars):
         symbol = template[i % len(template)]
-        if symbol in chords_dict:
-            c = copy.deepcopy(chords_dict[symbol])
-            c.lyric = symbol
-            c.quarterLength = 4.0
-            chord_stream.append(c)
+        if symbol in vocabulary:
+            progression.append(vocabulary[symbol])
         else:
-            tonic = copy.deepcopy(list(chords_dict.values())[0])
-            tonic.quarterLength = 4.0
-            chord_stream.append(tonic)
+            # Unknown symbol: fall back to the tonic, without a lyric.
+            progression.append(chord_vocabulary(key_name, mode)[0]._replace(numeral=None))
+    return tuple(progression)
+
+
+def to_music21_chord(spec, quarter_length=4.0):
+    """Builds a fresh music21 Chord from a ChordSpec."""
+    from music21 import chord
+    c = chord.Chord(spec.names)
+    if spec.numeral:
+        c.lyric = spec.numeral
+    c.quarterLength = quarter_length
+    return c
+
+# -------------------------------
+# Chord progression generator
+# -------------------------------
+def generate_chords(key_name="C", mode="major", num_bars=4):
+    from music21 import stream, tempo
+    chord_stream = stream.Stream()
+    chord_stream.append(tempo.MetronomeMark(number=100))
+
+    for spec in chord_progression(key_name, mode, num_bars):
+        chord_stream.append(to_music21_chord(spec))
 
     return chord_stream
@@ -0,0 +1,199 @@
+"""
+Composer Module
+---------------
+The generate-and-export pipeline shared by the CLI (`main.py`) and the
+web job queue (`composition_jobs.py`): melody from a trained
+MelodyGenerator, chords from the rule-based progression, then MIDI and/or
+MusicXML files. Nothing here prompts, prints progress or opens an editor,
+so it can run unattended in a worker.
+
+Each requested format is rendered by `render`, one call per file, in this
+process: the MIDI file first (a few milliseconds), then the MusicXML
+score. A process pool would only add its start-up time. With an
+ArtifactCache, finished files are stored under a key of (model, seed,
+key, mode, bars, temperature) and an identical request returns them
+without generating or writing anything.
+
+music21 is only imported when a MusicXML score is built, so MIDI-only
+jobs (and processes that never compose) do not pay its load time.
+"""
+
+import os
+import random
+from pathlib import Path
+
+import metrics
+from chord_generator import chord_progression, generate_chords
+from rhythm import fit, timeline
+from utils import export_midi
+
+EXPORT_FORMATS = ("midi", "musicxml", "both")
+DEFAULT_TEMPERATURE = 1.2
+
+# File suffix of each rendered format.
+SUFFIXES = {"midi": ".mid", "musicxml": ".mxl"}
+
+# Part of every artifact cache key; bump when `render` output changes.
+ARTIFACT_VERSION = 2
+
+
+# -------------------------------
+# Pipeline
+# -------------------------------
+def compose(generator, key_root, mode, num_bars, export_format, out_dir, basename=None,
+            temperature=DEFAULT_TEMPERATURE, seed=None, cache=None):
+    """
+    Generates one composition and writes its files.
+
+    Args:
+        generator (MelodyGenerator): A trained generator; it is only read.
+        key_root (str): Key letter (C, D, E, F, G, A, B).
+        mode (str): 'major' or 'minor'.
+        num_bars (int): Length of the piece in 4/4 bars; the melody is
+            generated until its rhythm fills them.
+        export_format (str): One of EXPORT_FORMATS.
+        out_dir (str): Folder the files are written to (unused with `cache`).
+        basename (str): File name without extension; defaults to the title.
+        seed (int): Seed of the melody; a random one is drawn if None. The
+            same model, seed and parameters always give the same piece.
+        cache (ArtifactCache): Store the files here, under the piece's
+            content key, and reuse any already stored.
+
+    Returns:
+        dict: 'title', 'events' (melody event count), 'seed', 'cached'
+        (True if nothing had to be rendered) and the 'midi' and/or
+        'musicxml' paths.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export_format must be one of {EXPORT_FORMATS}")
+    key_root = key_root.upper()
+    key_name = key_root if mode == 'major' else key_root.lower()
+    title = f"AI Composition in {key_root} {mode}"
+    seed = random.randrange(2 ** 32) if seed is None else int(seed)
+    formats = ["midi"] + (["musicxml"] if export_format in ("musicxml", "both") else [])
+
+    if cache is not None:
+        key = cache.key(model=generator.chain.fingerprint(), seed=seed, key=key_name, mode=mode,
+                        bars=num_bars, temperature=float(temperature), version=ARTIFACT_VERSION)
+        meta, found = cache.lookup(key, [SUFFIXES[fmt] for fmt in formats])
+        paths = {fmt: cache.path(key, SUFFIXES[fmt]) for fmt in formats}
+        if meta is not None and len(found) == len(formats):
+            metrics.incr("compose.cache_hits")
+            return {"title": title, "events": meta["events"], "seed": seed, "cached": True, **paths}
+        metrics.incr("compose.cache_misses")
+        todo = [fmt for fmt in formats if SUFFIXES[fmt] not in found]
+    else:
+        out_dir = Path(out_dir)
+        basename = basename or title.replace(' ', '_')
+        paths = {fmt: str(out_dir / f"{basename}{SUFFIXES[fmt]}") for fmt in formats}
+        todo = formats
+
+    with metrics.span("generate"):
+        melody_events = fit(generator.generate_stream(key=key_name, temperature=temperature,
+                                                      rng=random.Random(seed)), num_bars * 4)
+    metrics.incr("generate.events", len(melody_events))
+    if not melody_events:
+        raise RuntimeError("Melody generation returned no events.")
+
+    for path in {os.path.dirname(paths[fmt]) for fmt in todo}:
+        os.makedirs(path, exist_ok=True)
+    for fmt in todo:
+        render(fmt, melody_events, key_name, mode, num_bars, title, paths[fmt])
+
+    if cache is not None:
+        cache.put_meta(key, {"title": title, "events": len(melody_events), "seed": seed})
+    metrics.incr("compose.completed")
+    return {"title": title, "events": len(melody_events), "seed": seed, "cached": False, **paths}
+
+
+def render(fmt, melody_events, key_name, mode, num_bars, title, path):
+    """
+    Writes one format of a composition to `path`.
+
+    The file is written under a temporary name and renamed into place, so
+    nobody reading `path` sees it half-written.
+
+    Args:
+        fmt (str): 'midi' (melody and chords in one file) or 'musicxml'.
+        key_name (str): Key letter, lower-case for minor keys.
+    """
+    path = Path(path)
+    # Keep the suffix: music21 picks the (compressed) .mxl writer from it.
+    tmp_path = str(path.with_name(f".{path.stem}.{os.getpid()}.tmp{path.suffix}"))
+    try:
+        if fmt == "midi":
+            # MIDI is written directly from the events (no music21 Score needed)
+            with metrics.span("chords.progression"):
+                progression = chord_progression(key_name, mode, num_bars)
+            if not progression:
+                raise RuntimeError("Chord generation returned an empty progression.")
+            with metrics.span("export.midi"):
+                export_midi(melody_events, progression, tmp_path, title=title, beats=num_bars * 4)
+        elif fmt == "musicxml":
+            # The full music21 score is only built when MusicXML was requested
+            with metrics.span("chords.music21_stream"):
+                chord_stream = generate_chords(key_name, mode, num_bars)
+            with metrics.span("score.build"):
+                score = build_score(melody_events, chord_stream, title, beats=num_bars * 4)
+            with metrics.span("export.musicxml_write"):
+                score.write("musicxml", fp=tmp_path)
+        else:
+            raise ValueError(f"Unknown format: {fmt}")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+# -------------------------------
+# Score assembly (only needed for MusicXML output)
+# -------------------------------
+def build_score(melody_events, chord_stream, composition_title, beats=None):
+    """
+    Assembles melody events and a chord stream into a music21 Score with measures.
+
+    Args:
+        beats (float): Cut the melody off at this length, as `rhythm.timeline` does.
+    """
+    from music21 import stream, note, clef, metadata
+
+    # Create separate, structured Parts for melody and chords
+
+    # --- MELODY PART ---
+    melody_part = stream.Part()
+    melody_part.id = 'melody'
+    melody_part.append(clef.TrebleClef())
+    # Convert AI events to music21 notes with their quantized rhythm,
+    # filling gaps between notes with rests
+    position = 0.0
+    for pitch, start, length in timeline(melody_events, beats):
+        if start > position:
+            melody_part.append(note.Rest(quarterLength=start - position))
+        melody_part.append(note.Note(pitch, quarterLength=length))
+        position = start + length
+
+    # --- CHORD PART ---
+    chord_part = stream.Part()
+    chord_part.id = 'chords'
+    chord_part.append(clef.BassClef())
+    # The chord_generator should already return a stream of chords. We just append them.
+    for ch in chord_stream:
+        chord_part.append(ch)
+
+    # Combine Parts into a final Score and add Metadata
+    full_score = stream.Score()
+    full_score.insert(0, metadata.Metadata())
+    full_score.metadata.title = composition_title
+    full_score.metadata.composer = "Generative AI System"
+    full_score.insert(0, melody_part)
+    full_score.insert(0, chord_part)
+
+    # VERY IMPORTANT: .makeMeasures() tells music21 to calculate the barlines.
+    # This is what fixes the "no measures found" error.
+    # Notes that run over a barline are split and tied.
+    with metrics.span("score.make_measures"):
+        full_score.makeMeasures(inPlace=True)
+        for part in full_score.parts:
+            part.makeTies(inPlace=True)
+    return full_score
@@ -0,0 +1,201 @@
+"""
+Composition Codec Module
+------------------------
+Compact binary encoding for the melody and chord columns of the
+compositions table.
+
+Layout (version 1):
+    b"MC" | version (1 byte) | flags (1 byte) | payload
+flags:
+    0x01  payload is zlib-compressed
+    0x02  payload holds chords (otherwise a melody)
+    0x04  payload is UTF-8 JSON (for data the packed forms cannot hold)
+    0x08  melody events are (pitch, rhythm code) pairs, see rhythm.py
+Melody payload: varint event count, then per event a uint8 pitch (a MIDI
+note, so always below 0x80) and a varint timing value: a rhythm code with
+FLAG_RHYTHM, otherwise the raw MIDI tick delta melodies held before the
+rhythm grid. Chord payload: varint count, then per chord a varint byte
+length and the UTF-8 symbol.
+
+Rows written before this format are JSON text; the decoders accept those
+unchanged, so old and new rows can be read side by side. They, like binary
+rows without FLAG_RHYTHM, hold tick deltas; `melody_timing` tells the two
+kinds apart.
+"""
+
+import json
+import zlib
+
+import numpy as np
+
+from rhythm import CODES
+
+MAGIC = b"MC"
+VERSION = 1
+
+FLAG_ZLIB = 0x01
+FLAG_CHORDS = 0x02
+FLAG_JSON = 0x04
+FLAG_RHYTHM = 0x08
+
+# Payloads shorter than this are never worth a zlib header.
+COMPRESS_MIN_BYTES = 64
+
+# Below this many events a plain decode loop beats NumPy's per-call
+# overhead (measured crossover: between 96 and 128 events; see
+# benchmarks/bench_codec.py). Encoding always uses the loop: converting the
+# event list to an array alone costs more than packing it.
+DECODE_VECTORIZE_MIN_EVENTS = 128
+
+
+# -------------------------------
+# Melody
+# -------------------------------
+def encode_melody(melody_events, compress=None, rhythm=True):
+    """
+    Packs (pitch, rhythm) events into bytes.
+
+    Args:
+        melody_events (list): (pitch, rhythm code) pairs, pitch 0-127.
+        compress (bool): Force zlib on or off; None keeps whichever is smaller.
+        rhythm (bool): The second values are rhythm codes. False stores
+            legacy (pitch, tick delta) events, any delta >= 0.
+    """
+    flags = FLAG_RHYTHM if rhythm else 0
+    limit = CODES if rhythm else float("inf")
+    payload = bytearray()
+    _write_varint(payload, len(melody_events))
+    for pitch, delta in melody_events:
+        if not 0 <= pitch <= 127:
+            raise ValueError("pitches must be MIDI notes (0-127)")
+        if not 0 <= delta < limit:
+            raise ValueError(_timing_error(rhythm))
+        payload.append(pitch)
+        if delta < 0x80:
+            payload.append(delta)       # one-byte varint, the common case
+        else:
+            _write_varint(payload, delta)
+    return _pack(payload, flags, compress)
+
+
+def _timing_error(rhythm):
+    return f"rhythm codes must be 0-{CODES - 1}" if rhythm else "delta times must not be negative"
+
+
+def melody_timing(data):
+    """
+    What the second value of each stored melody event means: 'rhythm'
+    (a rhythm code) or 'ticks' (a raw MIDI tick delta, from rows written
+    before the rhythm grid, including all JSON text rows).
+    """
+    if isinstance(data, str):
+        return "ticks"
+    if bytes(data[:2]) != MAGIC:
+        raise ValueError("not an encoded composition column")
+    return "rhythm" if data[3] & FLAG_RHYTHM else "ticks"       # flags are never compressed
+
+
+def decode_melody(data):
+    """
+    Unpacks bytes from `encode_melody` (or legacy JSON text) into
+    (pitch, rhythm) tuples, or (pitch, tick delta) for legacy rows (see
+    `melody_timing`).
+    """
+    if isinstance(data, str):
+        return [tuple(event) for event in json.loads(data)]
+    flags, payload = _unpack(data)
+    if flags & FLAG_JSON:
+        return [tuple(event) for event in json.loads(payload.decode("utf-8"))]
+    count, pos = _read_varint(payload, 0)
+    if count < DECODE_VECTORIZE_MIN_EVENTS:
+        events = []
+        for _ in range(count):
+            pitch = payload[pos]
+            delta, pos = _read_varint(payload, pos + 1)
+            events.append((pitch, delta))
+        return events
+
+    # Pitches are single bytes below 0x80, so the body is one run of varints
+    # alternating pitch, delta; each ends at a byte without the high bit.
+    body = np.frombuffer(payload, dtype=np.uint8, offset=pos).astype(np.int64)
+    ends = np.flatnonzero(body < 0x80)[:2 * count]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    token = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = 7 * (np.arange(len(token)) - starts[token])
+    values = np.bincount(token, weights=(body[:len(token)] & 0x7F) << shift).astype(np.int64)
+    return list(zip(values[0::2].tolist(), values[1::2].tolist()))
+
+
+# -------------------------------
+# Chords
+# -------------------------------
+def encode_chords(chord_sequence, compress=None):
+    """Packs a list of chord symbols into bytes (JSON inside the envelope for other data)."""
+    if not all(isinstance(symbol, str) for symbol in chord_sequence):
+        return _pack(json.dumps(chord_sequence).encode("utf-8"), FLAG_CHORDS | FLAG_JSON, compress)
+    payload = bytearray()
+    _write_varint(payload, len(chord_sequence))
+    for symbol in chord_sequence:
+        encoded = symbol.encode("utf-8")
+        _write_varint(payload, len(encoded))
+        payload += encoded
+    return _pack(payload, FLAG_CHORDS, compress)
+
+
+def decode_chords(data):
+    """Unpacks bytes from `encode_chords` (or legacy JSON text)."""
+    if isinstance(data, str):
+        return json.loads(data)
+    flags, payload = _unpack(data)
+    if flags & FLAG_JSON:
+        return json.loads(payload.decode("utf-8"))
+    count, pos = _read_varint(payload, 0)
+    symbols = []
+    for _ in range(count):
+        length, pos = _read_varint(payload, pos)
+        symbols.append(bytes(payload[pos:pos + length]).decode("utf-8"))
+        pos += length
+    return symbols
+
+
+# -------------------------------
+# Envelope and varints
+# -------------------------------
+def _pack(payload, flags, compress):
+    payload = bytes(payload)
+    if compress or (compress is None and len(payload) >= COMPRESS_MIN_BYTES):
+        compressed = zlib.compress(payload, 6)
+        if compress or len(compressed) < len(payload):
+            payload, flags = compressed, flags | FLAG_ZLIB
+    return MAGIC + bytes((VERSION, flags)) + payload
+
+
+def _unpack(data):
+    data = bytes(data)
+    if data[:2] != MAGIC:
+        raise ValueError("not an encoded composition column")
+    if data[2] != VERSION:
+        raise ValueError(f"unsupported composition encoding version {data[2]}")
+    flags, payload = data[3], data[4:]
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    return flags, payload
+
+
+def _write_varint(buffer, value):
+    # LEB128: 7 bits per byte, high bit set on all but the last byte.
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
@@ -0,0 +1,303 @@
+"""
+Composition Jobs Module
+-----------------------
+Runs compositions in the background for the web API. Requests submit a job
+and get its id back immediately; a bounded pool of worker processes runs
+the generate/export pipeline (`composer.compose`) and clients poll for the
+result.
+
+The model is trained (or loaded from the cache) once, in a background
+thread, before the pool starts, and written out as a read-only shared model
+(`model_store.save_shared`). Each worker memory-maps that instead of
+holding its own copy, so however many workers run, the model sits in memory
+once (in the page cache) and a new worker is ready in milliseconds.
+Running in processes lets throughput grow with the worker count, which
+threads could not do for this CPU-bound work.
+
+Workers are started with forkserver (spawn where that is unavailable), not
+forked from the threaded web process. If one dies, the pool is replaced and
+the jobs it held fail; a model that could not be prepared is retried after
+START_RETRY_SECONDS.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+import metrics
+from artifact_cache import ArtifactCache
+from melody_generator import MelodyGenerator
+from model_store import attach_shared, load_or_train, save_shared
+from composer import DEFAULT_TEMPERATURE, compose
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# How long a failed model preparation is reported before the next submit retries it.
+START_RETRY_SECONDS = 30.0
+
+
+class QueueFull(Exception):
+    """Raised by `CompositionQueue.submit` when `max_pending` jobs are already waiting."""
+
+
+# -------------------------------
+# Worker process side
+# -------------------------------
+# The generator the workers compose with, attached to the shared model, and
+# the worker's artifact cache (one per process, so its pruning is spread
+# over many jobs).
+_generator = None
+_artifacts = None
+
+
+def _init_worker(shared_path, metrics_enabled, out_dir, max_artifacts):
+    global _generator, _artifacts
+    metrics.enable(metrics_enabled)
+    generator = MelodyGenerator()
+    if not attach_shared(generator, shared_path):
+        raise RuntimeError(f"No shared model at {shared_path}")
+    _generator = generator
+    _artifacts = ArtifactCache(out_dir, max_entries=max_artifacts)
+
+
+def _run_job(params):
+    # The worker's spans and counters for this job travel back with the
+    # result and are merged into the web process's metrics.
+    metrics.reset()
+    with metrics.span("job.run"):
+        result = compose(_generator, params["key"], params["mode"], params["bars"],
+                         params["format"], _artifacts.directory, seed=params.get("seed"),
+                         cache=_artifacts)
+    if metrics.enabled():
+        result["metrics"] = metrics.snapshot()
+    return result
+
+
+def _mp_context():
+    """
+    Start method for the workers. Forking a process that runs threads (the
+    web server, the start thread) can copy a lock while another thread
+    holds it, so workers come from a forkserver that only imports this
+    module, or are spawned where there is no forkserver.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+# -------------------------------
+# Queue
+# -------------------------------
+class CompositionQueue:
+    """
+    Bounded background job queue for compositions.
+
+    Args:
+        training_data_path (str): Corpus folder for `load_or_train`.
+        cache_path (str): Model cache file for `load_or_train`.
+        shared_path (str): Folder for the shared model the workers map;
+            defaults to the cache file's name with a ".shared" suffix.
+        out_dir (str): Artifact cache the job files are written to. Files
+            are named by content key, so repeated requests (same seed and
+            parameters) share them and are answered without composing.
+        max_artifacts (int): Compositions kept in `out_dir`; the least
+            recently used are removed beyond it. Each worker prunes every
+            tenth of this many jobs, so the folder may briefly hold that
+            many more per worker. Keep it above `keep_finished`, so files
+            of jobs that can still be polled stay.
+        workers (int): Number of worker processes.
+        max_pending (int): Jobs that may be queued or running at once;
+            `submit` raises QueueFull beyond this.
+        keep_finished (int): Finished jobs remembered for polling; the
+            oldest are forgotten first.
+    """
+
+    def __init__(self, training_data_path, cache_path, out_dir, workers=2,
+                 max_pending=32, keep_finished=1000, shared_path=None, max_artifacts=5000):
+        self.training_data_path = training_data_path
+        self.cache_path = cache_path
+        self.shared_path = shared_path or os.path.splitext(cache_path)[0] + ".shared"
+        self.out_dir = out_dir
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.max_artifacts = max_artifacts
+        self.error = None               # set if the model could not be prepared
+        self._failed_at = None
+        self._pool = None
+        self._started = False
+        self._jobs = OrderedDict()      # job_id -> job dict, oldest first
+        self._waiting = []              # job ids submitted before the pool started
+        self._pending = 0
+        self._lock = threading.RLock()   # a done callback may run inside submit
+
+    def start(self):
+        """
+        Prepares the model and the worker pool in a background thread and returns at once.
+        Calling it again does nothing, unless the last attempt failed more
+        than START_RETRY_SECONDS ago.
+        """
+        with self._lock:
+            if self._started:
+                return
+            if self.error is not None and time.monotonic() - self._failed_at < START_RETRY_SECONDS:
+                return
+            self.error = None
+            self._started = True
+        threading.Thread(target=self._start, name="composition-queue-start", daemon=True).start()
+
+    def _start(self):
+        try:
+            generator = MelodyGenerator()
+            with metrics.span("jobs.prepare_model"):
+                load_or_train(generator, self.training_data_path, self.cache_path)
+                save_shared(generator, self.shared_path, temperatures=(1.0, DEFAULT_TEMPERATURE))
+            del generator           # workers map the shared copy instead
+            pool = self._new_pool()
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+                self._started = False       # the next submit after START_RETRY_SECONDS retries
+                for job_id in self._waiting:
+                    self._finish(job_id, error=f"Model unavailable: {e}")
+                self._waiting.clear()
+            return
+        with self._lock:
+            self._pool = pool
+            for job_id in self._waiting:
+                try:
+                    self._dispatch(job_id)
+                except Exception as e:
+                    self._finish(job_id, error=f"Could not queue composition: {e}")
+            self._waiting.clear()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context(),
+                                   initializer=_init_worker,
+                                   initargs=(self.shared_path, metrics.enabled(),
+                                             self.out_dir, self.max_artifacts))
+
+    @property
+    def ready(self):
+        """True once the model is loaded and the workers accept jobs."""
+        return self._pool is not None
+
+    @property
+    def pending(self):
+        """Jobs queued or running right now."""
+        return self._pending
+
+    def submit(self, params, owner=None):
+        """
+        Queues a composition and returns its job id without waiting for it.
+        Starts the queue if `start` has not been called yet.
+
+        Args:
+            params (dict): 'key', 'mode', 'bars', 'format' and optionally
+                'seed', as for `composer.compose`.
+            owner (str): Recorded on the job, e.g. so only its user may poll it.
+
+        Raises:
+            QueueFull: If `max_pending` jobs are already queued or running.
+            RuntimeError: If the model could not be trained or loaded, or
+                the job could not be handed to the workers.
+        """
+        self.start()
+        with self._lock:
+            if self.error is not None:
+                raise RuntimeError(f"Model unavailable: {self.error}")
+            if self._pending >= self.max_pending:
+                metrics.incr("jobs.rejected")
+                raise QueueFull(f"{self._pending} compositions already pending")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {"id": job_id, "status": QUEUED, "params": dict(params),
+                                  "owner": owner, "result": None, "error": None}
+            self._pending += 1
+            if self._pool is None:
+                self._waiting.append(job_id)
+            else:
+                try:
+                    self._dispatch(job_id)
+                except Exception as e:
+                    del self._jobs[job_id]
+                    self._pending -= 1
+                    raise RuntimeError(f"Could not queue composition: {e}") from e
+        return job_id
+
+    def status(self, job_id):
+        """Returns a copy of the job's dict ('id', 'status', 'params', 'owner', 'result', 'error'), or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        future = job.pop("future", None)
+        if job["status"] == QUEUED and future is not None and future.running():
+            job["status"] = RUNNING
+        return job
+
+    def shutdown(self, wait=True):
+        """Stops the worker pool; queued jobs that have not started are cancelled."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    # The helpers below run with self._lock held.
+    def _dispatch(self, job_id):
+        job = self._jobs[job_id]
+        try:
+            future = self._pool.submit(_run_job, job["params"])
+        except BrokenExecutor:
+            # A worker died before its done callback could replace the pool
+            self._replace_pool(self._pool)
+            future = self._pool.submit(_run_job, job["params"])
+        job["future"] = future
+        pool = self._pool
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f, pool))
+
+    def _replace_pool(self, broken):
+        """
+        Swaps a pool that lost a worker for a new one. The broken pool
+        accepts no more work and has already failed every job it held
+        (their done callbacks record BrokenProcessPool).
+        """
+        if self._pool is not broken:
+            return                  # already replaced
+        metrics.incr("jobs.pool_restarts")
+        self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, job_id, result=None, error=None):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job.pop("future", None)
+        job["status"] = FAILED if error is not None else DONE
+        job["result"], job["error"] = result, error
+        self._pending -= 1
+        finished = [jid for jid, j in self._jobs.items() if j["status"] in (DONE, FAILED)]
+        for old_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[old_id]
+
+    def _on_done(self, job_id, future, pool):
+        if future.cancelled():
+            result, error = None, "Cancelled"
+        elif future.exception() is not None:
+            result, error = None, str(future.exception())
+            if isinstance(future.exception(), BrokenExecutor):
+                with self._lock:
+                    self._replace_pool(pool)
+        else:
+            result, error = future.result(), None
+            job_metrics = result.pop("metrics", None)
+            if job_metrics:
+                metrics.merge(job_metrics)
+        metrics.incr("jobs.failed" if error is not None else "jobs.done")
+        with self._lock:
+            self._finish(job_id, result, error)
@@ -1,51 +1,273 @@
 # In src/database_manager.py
 import sqlite3
-import json # We'll store the melody/chord data as JSON text
+import threading
+from contextlib import contextmanager
+
+# Melody/chord data is stored in the compact binary format from
+# composition_codec (older rows may still hold JSON text; both decode).
+from composition_codec import encode_melody, decode_melody, encode_chords, decode_chords, melody_timing
 
 DATABASE_NAME = "compositions.db"
 
+# -------------------------------
+# Connection pool
+# -------------------------------
+# Up to POOL_SIZE connections per database file, shared by all threads and
+# tuned once when opened. A thread checks one out for the duration of a
+# call, so a thread-per-request server reuses the same few connections
+# instead of opening (and never closing) one per thread. WAL mode lets
+# readers proceed while a writer commits, and synchronous=NORMAL avoids an
+# fsync on every commit (WAL stays consistent).
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",     # 16 MB page cache
+    "PRAGMA temp_store=MEMORY",
+)
+POOL_SIZE = 8
+POOL_TIMEOUT = 10.0     # seconds to wait for a free connection
+
+class _Pool:
+    """Idle connections to one database file, at most POOL_SIZE in use at once."""
+
+    def __init__(self, database):
+        self.database = database
+        self.slots = threading.BoundedSemaphore(POOL_SIZE)
+        self.idle = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def acquire(self):
+        if not self.slots.acquire(timeout=POOL_TIMEOUT):
+            raise sqlite3.OperationalError(f"No free database connection after {POOL_TIMEOUT}s")
+        try:
+            with self.lock:
+                if self.idle:
+                    return self.idle.pop()
+            conn = sqlite3.connect(self.database, timeout=5.0, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            return conn
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            if self.closed:
+                conn.close()
+            else:
+                self.idle.append(conn)
+        self.slots.release()
+
+    def close(self):
+        """Closes the idle connections now and the checked-out ones when they come back."""
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+_pools = {}     # database file -> _Pool
+_pools_lock = threading.Lock()
+
+@contextmanager
+def connection():
+    """Checks a pooled connection to DATABASE_NAME out for the duration of the block."""
+    with _pools_lock:
+        pool = _pools.get(DATABASE_NAME)
+        if pool is None:
+            pool = _pools[DATABASE_NAME] = _Pool(DATABASE_NAME)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def close_connections():
+    """Closes every pooled connection (e.g. at shutdown or before deleting the file)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+# -------------------------------
+# Schema
+# -------------------------------
 def create_database():
     """Initializes the database and creates the compositions table if it doesn't exist."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS compositions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            melody_data TEXT NOT NULL,
-            chord_data TEXT NOT NULL,
-            key TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    conn.commit()
-    conn.close()
+    with connection() as conn, conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS compositions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                melody_data BLOB NOT NULL,
+                chord_data BLOB NOT NULL,
+                key TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        # Lets load_all_compositions walk the index instead of sorting the table.
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_compositions_timestamp
+            ON compositions (timestamp);
+        """)
     print("Database initialized successfully.")
 
+# -------------------------------
+# Writes
+# -------------------------------
 def save_composition(name, melody_events, chord_sequence, key):
     """Saves a new composition to the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    # Convert the Python lists to JSON strings for storage
-    melody_json = json.dumps(melody_events)
-    chords_json = json.dumps(chord_sequence) # Assuming chords will be a list of strings
-    
-    cursor.execute("""
-        INSERT INTO compositions (name, melody_data, chord_data, key)
-        VALUES (?, ?, ?, ?)
-    """, (name, melody_json, chords_json, key))
-    
-    conn.commit()
-    conn.close()
+    with connection() as conn, conn:
+        conn.execute("""
+            INSERT INTO compositions (name, melody_data, chord_data, key)
+            VALUES (?, ?, ?, ?)
+        """, _composition_row(name, melody_events, chord_sequence, key))
     print(f"Composition '{name}' saved successfully.")
 
+def save_compositions(compositions):
+    """
+    Saves many compositions in a single transaction.
+
+    Args:
+        compositions: Iterable of (name, melody_events, chord_sequence, key) tuples.
+
+    Returns:
+        int: Number of compositions saved.
+    """
+    with connection() as conn, conn:
+        cursor = conn.executemany("""
+            INSERT INTO compositions (name, melody_data, chord_data, key)
+            VALUES (?, ?, ?, ?)
+        """, (_composition_row(*composition) for composition in compositions))
+    print(f"{cursor.rowcount} compositions saved successfully.")
+    return cursor.rowcount
+
+def _composition_row(name, melody_events, chord_sequence, key):
+    # Convert the Python lists to packed binary blobs for storage
+    return name, encode_melody(melody_events), encode_chords(chord_sequence), key
+
+def migrate_to_binary(batch_size=500):
+    """
+    Re-encodes rows still holding JSON text in the binary format.
+
+    Safe to run repeatedly; each batch is its own transaction, so a large
+    table never holds the write lock for long.
+
+    Returns:
+        int: Number of rows converted.
+    """
+    converted = 0
+    last_id = 0
+    with connection() as conn:
+        while True:
+            rows = conn.execute("""
+                SELECT id, melody_data, chord_data FROM compositions
+                WHERE id > ? AND (typeof(melody_data) = 'text' OR typeof(chord_data) = 'text')
+                ORDER BY id LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany(
+                    "UPDATE compositions SET melody_data = ?, chord_data = ? WHERE id = ?",
+                    # JSON rows predate the rhythm grid: their melodies hold tick deltas
+                    [(encode_melody(decode_melody(melody), rhythm=melody_timing(melody) == "rhythm"),
+                      encode_chords(decode_chords(chords)), row_id)
+                     for row_id, melody, chords in rows])
+            converted += len(rows)
+            last_id = rows[-1][0]
+    print(f"Migrated {converted} compositions to the binary format.")
+    return converted
+
+# -------------------------------
+# Reads
+# -------------------------------
 def load_all_compositions():
     """Loads all saved composition names and IDs from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, timestamp FROM compositions ORDER BY timestamp DESC")
-    compositions = cursor.fetchall()
-    conn.close()
-    return compositions # Returns a list of (id, name, timestamp) tuples
-
-# You would also create a function like load_composition_by_id(id) later
\ No newline at end of file
+    with connection() as conn:
+        # Served in order by a backwards scan of idx_compositions_timestamp
+        # (ties come out newest id first), so no sort step is needed.
+        cursor = conn.execute("SELECT id, name, timestamp FROM compositions ORDER BY timestamp DESC, id DESC")
+        return cursor.fetchall() # Returns a list of (id, name, timestamp) tuples
+
+def list_compositions(limit=20, cursor=None):
+    """
+    Loads one page of (id, name, timestamp) rows, newest first.
+
+    Uses keyset pagination on id: `cursor` is the id of the last row of the
+    previous page, so every page is a primary-key seek plus `limit` rows,
+    however deep into the table it is. Ids are AUTOINCREMENT, so they rise
+    in insert order just like the DEFAULT timestamp, but without its ties:
+    the timestamp has one-second resolution and a bulk insert shares one.
+
+    Returns:
+        tuple: (rows, next_cursor); next_cursor is None on the last page.
+    """
+    with connection() as conn:
+        if cursor is None:
+            rows = conn.execute("""
+                SELECT id, name, timestamp FROM compositions
+                ORDER BY id DESC LIMIT ?
+            """, (limit,)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT id, name, timestamp FROM compositions
+                WHERE id < ?
+                ORDER BY id DESC LIMIT ?
+            """, (cursor, limit)).fetchall()
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return rows, next_cursor
+
+def load_composition_by_id(composition_id, include_data=False):
+    """
+    Loads one composition as a dict, or None if there is no such id.
+
+    The melody and chord columns are only read and decoded (into 'melody'
+    and 'chords') when `include_data` is True.
+    """
+    with connection() as conn:
+        if include_data:
+            row = conn.execute("""
+                SELECT id, name, key, timestamp, melody_data, chord_data
+                FROM compositions WHERE id = ?
+            """, (composition_id,)).fetchone()
+        else:
+            row = conn.execute("""
+                SELECT id, name, key, timestamp FROM compositions WHERE id = ?
+            """, (composition_id,)).fetchone()
+        return _composition_dict(row) if row else None
+
+def iter_compositions(include_data=True, batch_size=500):
+    """
+    Yields every composition as a dict, oldest first, without loading the table.
+
+    Rows are fetched `batch_size` at a time by id, so memory stays constant
+    however many compositions are stored (e.g. for exporting them all).
+    """
+    columns = "id, name, key, timestamp" + (", melody_data, chord_data" if include_data else "")
+    last_id = 0
+    while True:
+        # A connection per batch, so a slow consumer does not hold one from the pool
+        with connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {columns} FROM compositions WHERE id > ? ORDER BY id LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+        for row in rows:
+            yield _composition_dict(row)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+def _composition_dict(row):
+    composition = {"id": row[0], "name": row[1], "key": row[2], "timestamp": row[3]}
+    if len(row) > 4:
+        composition["melody"] = decode_melody(row[4])
+        composition["timing"] = melody_timing(row[4])     # 'rhythm', or 'ticks' for old rows
+        composition["chords"] = decode_chords(row[5])
+    return composition
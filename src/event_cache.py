@@ -0,0 +1,80 @@
+"""
+Event Cache Module
+------------------
+Keeps the (pitch, rhythm) events extracted from each training MIDI file on
+disk, keyed by the SHA-256 of the file's contents, so a file is parsed once
+no matter how often the model is retrained. Each entry is a plain .npy file
+holding an (N, 2) int32 array (memory-mappable with np.load(mmap_mode='r')).
+
+Keys are content hashes, so identical files (e.g. "pachelbel.mid" and
+"pachelbel(1).mid") share one entry and an entry can never go stale: a
+changed file simply has a new key.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+# Version of the extracted events (melody_generator._read_midi_events). Part
+# of every entry's name, so entries from an older extraction are ignored.
+EVENT_VERSION = 2
+
+
+def file_sha256(file_path):
+    """Hex SHA-256 of a file's contents."""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class EventCache:
+    """A folder of <sha256>.v<EVENT_VERSION>.npy event arrays."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, digest):
+        return os.path.join(self.directory, f"{digest}.v{EVENT_VERSION}.npy")
+
+    def get(self, digest, mmap=False):
+        """
+        Returns the cached (N, 2) int32 events for a content hash, or None.
+
+        Args:
+            mmap (bool): Map the file read-only instead of reading it.
+        """
+        try:
+            events = np.load(self.path(digest), mmap_mode='r' if mmap else None, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        if events.dtype != np.int32 or events.ndim != 2 or events.shape[1] != 2:
+            return None
+        return events
+
+    def put(self, digest, events):
+        """
+        Stores the events of a content hash. A cache that cannot be written
+        (read-only or full disk) is not an error; the file is just parsed
+        again next time.
+
+        Returns:
+            bool: True if the entry was written.
+        """
+        path = self.path(digest)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(events, dtype=np.int32).reshape(-1, 2))
+            # Replace atomically so a concurrent reader never sees a partial file.
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        return True
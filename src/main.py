@@ -4,15 +4,15 @@
 
 import sys
 import os
+import argparse
 import subprocess
 from pathlib import Path
 
-# --- Music21 Imports (All necessary tools) ---
-from music21 import stream, note, duration, clef, meter, chord, metadata
-
 # --- Custom Module Imports ---
+import metrics
 from melody_generator import MelodyGenerator
-from chord_generator import generate_chords
+from model_store import load_or_train
+from composer import compose, EXPORT_FORMATS
 
 
 # ==============================================================================
@@ -70,6 +70,7 @@ def main():
     key_root = input("Enter key (C, D, E, F, G, A, B): ").strip().upper()
     mode = input("Enter mode (major/minor): ").strip().lower()
     num_bars_input = input("Enter number of bars (default 4): ").strip()
+    export_format = input("Export format (midi/musicxml/both, default both): ").strip().lower()
 
     try:
         num_bars = int(num_bars_input)
@@ -78,89 +79,60 @@ def main():
         num_bars = 4
         print("Invalid input! Defaulting to 4 bars.")
 
-    key_name = key_root.upper() if mode == 'major' else key_root.lower()
+    if export_format not in EXPORT_FORMATS:
+        export_format = "both"
+
     composition_title = f"AI Composition in {key_root} {mode}"
     print(f"\nGenerating: {composition_title}...")
 
-    # 2) Initialize and Train the Melody AI
+    # 2) Initialize and Train the Melody AI (reuses the cached model if the corpus is unchanged)
     melody_engine = MelodyGenerator()
     training_data_path = Path(__file__).parent.parent / "training_data"
-    melody_engine.train(str(training_data_path))
-
-    # 3) Generate Raw Melody Data from the AI
-    melody_length = num_bars * 8
-    melody_events = melody_engine.generate(length=melody_length, key=key_name, temperature=1.2)
-    if not melody_events:
-        print("Error: Melody generation returned no events. Exiting.")
-        return
-    print(f"-> Melody data generated by AI ({len(melody_events)} events).")
-
-    # 4) Generate the Chord Progression (this should return a music21 Stream)
-    chord_stream = generate_chords(key_name, mode, num_bars)
-    if not chord_stream or len(chord_stream.flatten().notesAndRests) == 0:
-        print("Error: Chord generation returned an empty stream. Exiting.")
-        return
-    print("-> Chord progression generated.")
-
-    # 5) === NEW, ROBUST ASSEMBLY PROCESS ===
-    # Create separate, structured Parts for melody and chords
-    
-    # --- MELODY PART ---
-    melody_part = stream.Part()
-    melody_part.id = 'melody'
-    melody_part.append(clef.TrebleClef())
-    # Convert AI events to music21 notes and add them one by one
-    TICKS_PER_QUARTER = 480.0
-    for pitch, time_delta_ticks in melody_events:
-        # We'll represent the rhythm by just giving each note a fixed duration for now
-        # A more advanced system would convert time_delta_ticks into rests.
-        n = note.Note(pitch)
-        n.duration = duration.Duration(0.5) # Eighth note
-        melody_part.append(n)
-
-    # --- CHORD PART ---
-    chord_part = stream.Part()
-    chord_part.id = 'chords'
-    chord_part.append(clef.BassClef())
-    # The chord_generator should already return a stream of chords. We just append them.
-    for ch in chord_stream:
-        chord_part.append(ch)
-        
-    print("-> Melody and chords structured into Parts.")
-
-    # 6) Combine Parts into a final Score and add Metadata
-    full_score = stream.Score()
-    full_score.insert(0, metadata.Metadata())
-    full_score.metadata.title = composition_title
-    full_score.metadata.composer = "Generative AI System"
-    full_score.insert(0, melody_part)
-    full_score.insert(0, chord_part)
-    
-    # VERY IMPORTANT: .makeMeasures() tells music21 to calculate the barlines.
-    # This is what fixes the "no measures found" error.
-    full_score.makeMeasures(inPlace=True)
-    
-    print("-> Final score assembled and measures calculated.")
+    model_cache_path = Path(__file__).parent.parent / ".cache" / "melody_model.npz"
+    load_or_train(melody_engine, str(training_data_path), str(model_cache_path), workers=0)
 
-    # 7) Prepare output paths and save the files
+    # 3) Generate the melody and chords and export them (shared with the web job queue)
     out_dir = Path(__file__).parent.parent / "output"
-    out_dir.mkdir(exist_ok=True)
-    out_midi = out_dir / f"{composition_title.replace(' ', '_')}.mid"
-    out_xml = out_dir / f"{composition_title.replace(' ', '_')}.mxl"
-
-    full_score.write("midi", fp=str(out_midi))
-    full_score.write("musicxml", fp=str(out_xml))
-    
+    try:
+        result = compose(melody_engine, key_root, mode, num_bars, export_format, out_dir)
+    except RuntimeError as e:
+        print(f"Error: {e} Exiting.")
+        return
+    print(f"-> Melody data generated by AI ({result['events']} events).")
     print(f"\n✅ Composition exported successfully!")
-    print(f"   MIDI: {out_midi}")
-    print(f"   MusicXML: {out_xml}")
+    print(f"   MIDI: {result['midi']}")
+    if "musicxml" in result:
+        print(f"   MusicXML: {result['musicxml']}")
 
-    # 8) Automatically open the score in MuseScore
-    open_in_musescore(str(out_xml))
+    # 4) Automatically open the score in MuseScore
+    with metrics.span("musescore.launch"):
+        open_in_musescore(result.get("musicxml", result["midi"]))
 
 
 # ==============================================================================
 # SCRIPT ENTRY POINT
 # ==============================================================================
+def cli(argv=None):
+    """Runs `main()` with optional per-stage metrics and profiling."""
+    parser = argparse.ArgumentParser(description="Music Composition System")
+    parser.add_argument("--metrics", action="store_true",
+                        help="print per-stage timings and counters when done")
+    parser.add_argument("--profile", nargs="?", const="-", metavar="FILE",
+                        help="profile the run; print the top functions, or save them to FILE")
+    parser.add_argument("--profiler", choices=("cprofile", "pyinstrument"), default="cprofile",
+                        help="profiler used by --profile (pyinstrument must be installed)")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        metrics.enable()
+    if args.profile:
+        with metrics.profile(None if args.profile == "-" else args.profile, args.profiler):
+            main()
+    else:
+        main()
+    if args.metrics:
+        print("\n" + metrics.report())
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    cli()
\ No newline at end of file
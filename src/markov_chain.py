@@ -0,0 +1,501 @@
+"""
+Markov Chain Module
+-------------------
+Array-backed transition table for the melody model.
+
+Every distinct event (a row such as (pitch, rhythm)) is interned to an integer
+state ID. Transitions are stored CSR-style: the successors of context `c` are
+`successors[offsets[c]:offsets[c + 1]]`, each listed once with how often it
+was observed in `counts`. `cumulative` holds the running sum of `counts`
+over the whole table, so sampling a successor is a binary search inside one
+row and costs O(log out-degree) no matter how large the corpus is.
+
+Higher-order models keep one such table per context length. Contexts are
+nodes of a trie over state IDs read from the most recent event backwards:
+a level-1 node is a state ID, and a level-k node is identified by the key
+`(parent << 32) | older_state`, where `parent` is the level-(k-1) node for
+the k-1 most recent events. The keys of each level are stored sorted, so a
+lookup is a binary search. Walking the trie from the newest event towards
+older ones stops at the longest context seen in training, which is the
+backoff to shorter contexts on a miss.
+
+States with successors are also indexed by pitch (the first event value)
+and by pitch class, so start-note lookups and dead-end recovery never scan
+the whole table.
+"""
+
+import bisect
+import hashlib
+import random
+
+import numpy as np
+
+# Bits reserved for the older state ID in a trie key.
+KEY_SHIFT = 32
+
+
+def _ngrams(id_sequences, level):
+    """All (context, next) windows of one level; contexts are newest first."""
+    contexts, next_ids = [], []
+    for ids in id_sequences:
+        ends = np.arange(level - 1, len(ids) - 1)
+        contexts.append(np.column_stack([ids[ends - depth] for depth in range(level)])
+                        if len(ends) else np.zeros((0, level), dtype=np.int64))
+        next_ids.append(ids[ends + 1])
+    if not contexts:
+        return np.zeros((0, level), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(contexts), np.concatenate(next_ids)
+
+
+def _count_rows(parts, signs):
+    """Sums signed counts of identical (context, next) rows across parts."""
+    rows = np.concatenate([np.column_stack([contexts, next_ids]) for contexts, next_ids in parts])
+    weights = np.concatenate([np.full(len(next_ids), sign) for (_, next_ids), sign in zip(parts, signs)])
+    rows, inverse = np.unique(rows, axis=0, return_inverse=True)
+    counts = np.bincount(inverse.reshape(-1), weights=weights, minlength=len(rows)).astype(np.int64)
+    return rows[:, :-1], rows[:, -1], counts
+
+
+def _search(sorted_keys, keys, mask):
+    """Positions of `keys` in `sorted_keys`, and which of them (within `mask`) are present."""
+    positions = np.searchsorted(sorted_keys, keys)
+    found = mask & (positions < len(sorted_keys))
+    found[found] = sorted_keys[positions[found]] == keys[found]
+    return positions, found
+
+
+class TransitionTable:
+    """CSR successor lists with counts for one context level."""
+
+    def __init__(self, offsets, successors, counts, cumulative_by_temperature=None):
+        """
+        Args:
+            cumulative_by_temperature (dict): Running sums of the sampling
+                weights already computed for some temperatures (e.g. mapped
+                from a shared model file); others are computed on first use.
+        """
+        self.offsets = offsets          # (C + 1,) row starts into successors
+        self.successors = successors    # (T,) successor state IDs, sorted per row
+        self.counts = counts            # (T,) observed transition counts
+        self._cumulative_by_temperature = dict(cumulative_by_temperature or {})
+        self.cumulative = self._cumulative_by_temperature.get(1.0)
+        if self.cumulative is None:
+            self.cumulative = np.cumsum(counts, dtype=np.float64)
+            self._cumulative_by_temperature[1.0] = self.cumulative
+
+    @classmethod
+    def from_pairs(cls, rows, successors, n_rows, counts=None):
+        """
+        Counts (row, successor) pairs into a table with `n_rows` rows.
+
+        Args:
+            counts (np.ndarray): Optional weight of each pair; each pair
+                counts once if omitted.
+        """
+        keys = rows.astype(np.int64) << KEY_SHIFT | successors
+        if counts is None:
+            keys, counts = np.unique(keys, return_counts=True)
+        else:
+            keys, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse.reshape(-1), weights=counts, minlength=len(keys))
+        offsets = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys >> KEY_SHIFT, minlength=n_rows), out=offsets[1:])
+        return cls(offsets, (keys & ((1 << KEY_SHIFT) - 1)).astype(np.int32),
+                   counts.astype(np.int32))
+
+    def rows(self):
+        """Row index of every stored transition."""
+        return np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+
+    def nbytes(self):
+        return (self.offsets.nbytes + self.successors.nbytes + self.counts.nbytes
+                + sum(c.nbytes for c in self._cumulative_by_temperature.values()))
+
+    def sample(self, row, temperature=1.0, rng=random):
+        """Draws a successor of `row` weighted by count, or None for an empty row."""
+        lo, hi = int(self.offsets[row]), int(self.offsets[row + 1])
+        if lo == hi:
+            return None
+        cumulative = self.cumulative_for(temperature)
+        base = cumulative[lo - 1] if lo else 0.0
+        target = base + rng.random() * (cumulative[hi - 1] - base)
+        index = min(bisect.bisect_right(cumulative, target, lo, hi), hi - 1)
+        return int(self.successors[index])
+
+    def sample_many(self, rows, uniforms, temperature=1.0):
+        """Vectorised `sample`; returns -1 for empty rows."""
+        lo = self.offsets[rows]
+        hi = self.offsets[rows + 1]
+        live = hi > lo
+        cumulative = self.cumulative_for(temperature)
+        # `cumulative` is one running sum over every row, so a single global
+        # searchsorted lands inside the right row for all chains at once.
+        base = np.where(lo > 0, cumulative[np.maximum(lo - 1, 0)], 0.0)
+        top = cumulative[np.maximum(hi - 1, 0)]
+        index = np.searchsorted(cumulative, base + uniforms * (top - base), side='right')
+        index = np.clip(index, lo, np.maximum(hi - 1, lo))
+        next_ids = np.full(len(rows), -1, dtype=np.int64)
+        next_ids[live] = self.successors[index[live]]
+        return next_ids
+
+    def cumulative_for(self, temperature):
+        """Cumulative weights with counts re-weighted as count ** (1 / temperature)."""
+        temperature = float(temperature)
+        cumulative = self._cumulative_by_temperature.get(temperature)
+        if cumulative is None:
+            if temperature <= 0:
+                raise ValueError("temperature must be positive")
+            # Scale each row by its largest count before exponentiating so
+            # low temperatures cannot overflow.
+            degrees = np.diff(self.offsets)
+            rows = self.rows()
+            log_counts = np.log(self.counts.astype(np.float64))
+            row_max = np.zeros(len(degrees))
+            starts = self.offsets[:-1][degrees > 0]
+            row_max[degrees > 0] = np.maximum.reduceat(log_counts, starts) if len(starts) else []
+            weights = np.exp((log_counts - row_max[rows]) / temperature)
+            cumulative = np.cumsum(weights)
+            self._cumulative_by_temperature[temperature] = cumulative
+        return cumulative
+
+
+class MarkovChain:
+    """Order-k transition model over interned events, with backoff."""
+
+    def __init__(self, events, tables, context_keys=()):
+        self.events = events                    # (S, W) event values, row = state ID
+        self.tables = list(tables)              # tables[k - 1] holds level-k contexts
+        self.context_keys = list(context_keys)  # sorted trie keys for levels 2..order
+        self.order = len(self.tables)
+        self._event_ids = None
+        self._fingerprint = None
+        self._live_states = np.flatnonzero(np.diff(self.offsets) > 0)
+        self._build_pitch_index()
+
+    # First-order table, kept as attributes for callers that only need it.
+    @property
+    def offsets(self):
+        return self.tables[0].offsets
+
+    @property
+    def successors(self):
+        return self.tables[0].successors
+
+    @property
+    def counts(self):
+        return self.tables[0].counts
+
+    @property
+    def cumulative(self):
+        return self.tables[0].cumulative
+
+    # -------------------------------
+    # Construction
+    # -------------------------------
+    @classmethod
+    def from_sequences(cls, sequences, width=2, order=1):
+        """
+        Builds the model from event sequences, one per training file.
+
+        Args:
+            sequences (list): Arrays or lists of event rows. Transitions are
+                only counted between neighbours of the same sequence.
+            width (int): Number of values per event.
+            order (int): Longest context length, in events.
+        """
+        if order < 1:
+            raise ValueError("order must be at least 1")
+        arrays = [np.asarray(seq, dtype=np.int64).reshape(-1, width) for seq in sequences]
+        arrays = [a for a in arrays if len(a)]
+        if not arrays:
+            empty = np.zeros(0, dtype=np.int32)
+            return cls(np.zeros((0, width), dtype=np.int32),
+                       [TransitionTable(np.zeros(1, dtype=np.int64), empty, empty)
+                        for _ in range(order)],
+                       [np.zeros(0, dtype=np.int64) for _ in range(order - 1)])
+
+        events, ids = np.unique(np.concatenate(arrays), axis=0, return_inverse=True)
+        ids = ids.reshape(-1).astype(np.int64)
+        lengths = np.array([len(a) for a in arrays])
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        position = np.arange(len(ids)) - starts       # index of each event in its sequence
+        has_next = position < np.repeat(lengths, lengths) - 1
+
+        # Every position with a following event ends one context per level.
+        ends = np.flatnonzero(has_next)
+        next_ids = ids[ends + 1]
+        nodes = ids[ends]
+        tables = [TransitionTable.from_pairs(nodes, next_ids, len(events))]
+        context_keys = []
+        for level in range(2, order + 1):
+            keep = position[ends] >= level - 1
+            ends, next_ids, nodes = ends[keep], next_ids[keep], nodes[keep]
+            keys, nodes = np.unique(nodes << KEY_SHIFT | ids[ends - (level - 1)], return_inverse=True)
+            nodes = nodes.reshape(-1)
+            context_keys.append(keys)
+            tables.append(TransitionTable.from_pairs(nodes, next_ids, len(keys)))
+        return cls(events.astype(np.int32), tables, context_keys)
+
+    # -------------------------------
+    # Incremental updates
+    # -------------------------------
+    def updated(self, add=(), remove=()):
+        """
+        Returns a new model with the transitions of some sequences added or removed.
+
+        Only the given sequences are counted; the rest of the corpus is taken
+        from this model's tables. Removed sequences must have been added
+        before. Existing state IDs are kept and new events get new IDs.
+
+        Args:
+            add (list): Event sequences to count in.
+            remove (list): Event sequences to count out.
+        """
+        width = self.events.shape[1]
+        self.state_id(self.events[0] if len(self.events) else ())   # builds the lookup table
+        event_ids = dict(self._event_ids)
+        new_events = []
+
+        def intern(sequence):
+            ids = []
+            for event in np.asarray(sequence, dtype=np.int64).reshape(-1, width).tolist():
+                event = tuple(event)
+                state = event_ids.get(event)
+                if state is None:
+                    state = event_ids[event] = len(event_ids)
+                    new_events.append(event)
+                ids.append(state)
+            return np.array(ids, dtype=np.int64)
+
+        added = [intern(seq) for seq in add]
+        removed = [intern(seq) for seq in remove]
+        events = self.events
+        if new_events:
+            events = np.concatenate([events, np.array(new_events, dtype=np.int32)])
+
+        levels = []
+        for level, (contexts, next_ids, counts) in enumerate(self._ngram_counts(), start=1):
+            delta_contexts, delta_next, delta_counts = _count_rows(
+                [_ngrams(added, level), _ngrams(removed, level)], signs=(1, -1))
+            # Adjust transitions that already exist in place; only genuinely
+            # new ones are appended before the tables are rebuilt.
+            positions = self._locate(level, delta_contexts, delta_next)
+            known = positions >= 0
+            np.add.at(counts, positions[known], delta_counts[known])
+            contexts = np.concatenate([contexts, delta_contexts[~known]])
+            next_ids = np.concatenate([next_ids, delta_next[~known]])
+            counts = np.concatenate([counts, delta_counts[~known]])
+            keep = counts > 0
+            levels.append((contexts[keep], next_ids[keep], counts[keep]))
+        chain = self._compile(events, levels)
+        chain._event_ids = event_ids
+        return chain
+
+    def _locate(self, level, contexts, next_ids):
+        """Index of each (context, next) transition in the level's table, or -1."""
+        nodes = contexts[:, 0]
+        found = nodes < len(self.events)
+        for depth in range(1, level):
+            keys = self.context_keys[depth - 1]
+            nodes, found = _search(keys, nodes << KEY_SHIFT | contexts[:, depth], found)
+        table = self.tables[level - 1]
+        transitions = table.rows() << KEY_SHIFT | table.successors
+        positions, found = _search(transitions, nodes << KEY_SHIFT | next_ids, found)
+        return np.where(found, positions, -1)
+
+    def _ngram_counts(self):
+        """
+        Decodes every level into (contexts, next_ids, counts) arrays.
+
+        `contexts` has one column per event of the context, newest first.
+        """
+        levels = []
+        contexts = np.arange(len(self.events), dtype=np.int64).reshape(-1, 1)
+        for level, table in enumerate(self.tables, start=1):
+            if level > 1:
+                keys = self.context_keys[level - 2]
+                contexts = np.column_stack([contexts[keys >> KEY_SHIFT],
+                                            keys & ((1 << KEY_SHIFT) - 1)])
+            rows = table.rows()
+            levels.append((contexts[rows], table.successors.astype(np.int64),
+                           table.counts.astype(np.int64)))
+        return levels
+
+    @classmethod
+    def _compile(cls, events, levels):
+        """Builds the tables and trie keys from per-level (contexts, next_ids, counts)."""
+        tables, context_keys = [], []
+        for level, (contexts, next_ids, counts) in enumerate(levels, start=1):
+            nodes = contexts[:, 0]
+            for depth in range(1, level):
+                key = nodes << KEY_SHIFT | contexts[:, depth]
+                if depth < level - 1:
+                    nodes = np.searchsorted(context_keys[depth - 1], key)
+                else:
+                    keys, nodes = np.unique(key, return_inverse=True)
+                    nodes = nodes.reshape(-1)
+                    context_keys.append(keys)
+            n_rows = len(events) if level == 1 else len(context_keys[-1])
+            tables.append(TransitionTable.from_pairs(nodes, next_ids, n_rows, counts))
+        return cls(events, tables, context_keys)
+
+    # -------------------------------
+    # Lookup
+    # -------------------------------
+    def __len__(self):
+        """Number of states that have at least one successor."""
+        return len(self.live_states())
+
+    def __bool__(self):
+        return len(self.successors) > 0
+
+    def event(self, state_id):
+        """The event tuple for a state ID."""
+        return tuple(int(v) for v in self.events[state_id])
+
+    def state_id(self, event):
+        """The state ID for an event tuple, or None if it was never seen."""
+        if self._event_ids is None:
+            self._event_ids = {tuple(row): i for i, row in enumerate(self.events.tolist())}
+        return self._event_ids.get(tuple(event))
+
+    def live_states(self):
+        """IDs of all states with at least one successor."""
+        return self._live_states
+
+    def states_with_pitch(self, pitch):
+        """IDs of states with successors whose event starts on `pitch`."""
+        if not 0 <= pitch < 128:
+            return self._pitch_order[:0]
+        return self._pitch_order[self._pitch_offsets[pitch]:self._pitch_offsets[pitch + 1]]
+
+    def states_in_pitch_classes(self, pitch_classes):
+        """IDs of states with successors whose pitch class is in `pitch_classes`."""
+        pitch_classes = frozenset(pitch_classes)
+        states = self._states_by_pitch_classes.get(pitch_classes)
+        if states is None:
+            states = np.concatenate([self._pc_order[self._pc_offsets[pc]:self._pc_offsets[pc + 1]]
+                                     for pc in sorted(pitch_classes)] or [self._pc_order[:0]])
+            self._states_by_pitch_classes[pitch_classes] = states
+        return states
+
+    def fingerprint(self):
+        """Hex SHA-256 of every array of the model; equal models have equal fingerprints."""
+        if self._fingerprint is None:
+            h = hashlib.sha256()
+            arrays = [self.events, *self.context_keys]
+            for table in self.tables:
+                arrays += [table.offsets, table.successors, table.counts]
+            for array in arrays:
+                h.update(f"{array.dtype.str}{array.shape}".encode('ascii'))
+                h.update(np.ascontiguousarray(array).data)
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def context_sizes(self):
+        """Number of distinct contexts stored at each level, shortest first."""
+        return [len(table.offsets) - 1 for table in self.tables]
+
+    def nbytes(self):
+        """Approximate memory held by the model's arrays."""
+        return (self.events.nbytes + self._pitch_order.nbytes + self._pc_order.nbytes
+                + sum(table.nbytes() for table in self.tables)
+                + sum(keys.nbytes for keys in self.context_keys))
+
+    def _build_pitch_index(self):
+        """Groups live states by pitch and by pitch class (CSR, like the transitions)."""
+        pitches = self.events[self._live_states, 0].astype(np.int64)
+        order = np.argsort(pitches, kind='stable')
+        self._pitch_order = self._live_states[order]
+        self._pitch_offsets = np.searchsorted(pitches[order], np.arange(129))
+
+        pitch_classes = pitches % 12
+        order = np.argsort(pitch_classes, kind='stable')
+        self._pc_order = self._live_states[order]
+        self._pc_offsets = np.searchsorted(pitch_classes[order], np.arange(13))
+        self._states_by_pitch_classes = {}
+
+    # -------------------------------
+    # Sampling
+    # -------------------------------
+    def sample(self, state_id, temperature=1.0, rng=random):
+        """
+        Draws a successor of `state_id` weighted by its transition count.
+
+        Args:
+            temperature (float): 1.0 samples the observed distribution,
+                lower values favour frequent successors, higher values
+                flatten the distribution.
+
+        Returns:
+            int: Successor state ID, or None if the state is a dead end.
+        """
+        return self.tables[0].sample(state_id, temperature, rng)
+
+    def sample_many(self, state_ids, uniforms, temperature=1.0):
+        """
+        Vectorised first-order `sample` for many chains at once.
+
+        Args:
+            state_ids (np.ndarray): Current state of each chain.
+            uniforms (np.ndarray): One uniform [0, 1) draw per chain.
+
+        Returns:
+            np.ndarray: Successor state IDs, -1 where a state is a dead end.
+        """
+        return self.tables[0].sample_many(state_ids, uniforms, temperature)
+
+    def sample_context(self, history, temperature=1.0, rng=random):
+        """
+        Draws the next state from the longest known context ending `history`.
+
+        Args:
+            history (list): Recent state IDs, oldest first. Only the last
+                `order` entries are used.
+
+        Returns:
+            int: Successor state ID, or None if the newest state is a dead end.
+        """
+        level, node = 1, history[-1]
+        for older in reversed(history[-self.order:-1]):
+            keys = self.context_keys[level - 1]
+            key = node << KEY_SHIFT | older
+            index = int(np.searchsorted(keys, key))
+            if index == len(keys) or keys[index] != key:
+                break
+            level, node = level + 1, index
+        return self.tables[level - 1].sample(node, temperature, rng)
+
+    def sample_context_many(self, histories, uniforms, temperature=1.0):
+        """
+        Vectorised `sample_context` for many chains at once.
+
+        Args:
+            histories (np.ndarray): (n, h) recent state IDs, oldest first,
+                with -1 where a chain has less history.
+            uniforms (np.ndarray): One uniform [0, 1) draw per chain.
+
+        Returns:
+            np.ndarray: Successor state IDs, -1 where a state is a dead end.
+        """
+        nodes = histories[:, -1].astype(np.int64)
+        levels = np.ones(len(nodes), dtype=np.int64)
+        active = np.ones(len(nodes), dtype=bool)
+        for level in range(2, min(self.order, histories.shape[1]) + 1):
+            keys = self.context_keys[level - 2]
+            older = histories[:, -level]
+            active &= older >= 0
+            key = nodes << KEY_SHIFT | np.maximum(older, 0)
+            index = np.searchsorted(keys, key)
+            found = active & (index < len(keys))
+            found[found] = keys[index[found]] == key[found]
+            nodes[found] = index[found]
+            levels[found] = level
+            active = found
+
+        next_ids = np.empty(len(nodes), dtype=np.int64)
+        for level in np.unique(levels):
+            at_level = levels == level
+            next_ids[at_level] = self.tables[level - 1].sample_many(
+                nodes[at_level], uniforms[at_level], temperature)
+        return next_ids
@@ -1,34 +1,285 @@
+import itertools
 import random
 import os
+from collections import Counter, namedtuple
+from functools import lru_cache
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from mido import MidiFile
-from music21 import stream, note, scale
+
+import metrics
+import rhythm
+from event_cache import EventCache, file_sha256
+from markov_chain import MarkovChain
+from music_theory import scale_pitch_classes
+
+# Result of reading one training file. `error` is None on success.
+FileEvents = namedtuple("FileEvents", ["path", "events", "error"])
+
+
+def _as_event_array(events):
+    """Compact (N, 2) int32 array for a list of (pitch, rhythm) events."""
+    return np.array(events, dtype=np.int32).reshape(-1, 2)
+
+
+def _count_notes(sequences):
+    """Counter of how often each pitch occurs in some event arrays."""
+    counts = Counter()
+    for events in sequences:
+        counts.update(dict(enumerate(np.bincount(events[:, 0], minlength=128).tolist())))
+    return +counts
+
+
+@lru_cache(maxsize=None)
+def _scale_pitch_classes(key):
+    """Pitch classes (0-11) of the major (upper-case) or minor (lower-case) scale on `key`."""
+    return scale_pitch_classes(key, "major" if key.isupper() else "minor")
+
+
+def _count_parsed(results):
+    """Adds a batch of FileEvents to the parsing counters."""
+    if metrics.enabled():
+        metrics.incr("train.files_parsed", sum(r.error is None for r in results))
+        metrics.incr("train.files_failed", sum(r.error is not None for r in results))
+        metrics.incr("train.events_parsed", sum(len(r.events) for r in results))
+
+
+def _track_notes(track):
+    """
+    Pairs every note_on of a MIDI track with the note_off (or velocity-0
+    note_on) that releases it.
+
+    Returns:
+        tuple: (pitches, onsets, releases) lists in track order, times in
+        ticks from the start of the track. Notes never released ring until
+        the end of the track.
+    """
+    pitches, onsets, releases = [], [], []
+    sounding = {}       # (channel, note) -> indices of unreleased notes, oldest first
+    now = 0
+    for msg in track:
+        now += msg.time         # msg.time is relative to the previous message
+        if msg.type == 'note_on' and msg.velocity > 0:
+            sounding.setdefault((msg.channel, msg.note), []).append(len(pitches))
+            pitches.append(msg.note)
+            onsets.append(now)
+            releases.append(None)
+        elif msg.type in ('note_on', 'note_off'):
+            started = sounding.get((msg.channel, msg.note))
+            if started:
+                releases[started.pop(0)] = now
+    return pitches, onsets, [now if r is None else r for r in releases]
+
+
+def _read_midi_events(file_path):
+    """Extracts quantized (pitch, rhythm) events from a MIDI file as a FileEvents result.
+
+    Onset gaps and note_on/note_off durations are converted from ticks to
+    beats with the file's ticks_per_beat and snapped to the rhythm grid
+    (see rhythm.py). Module-level so it can be sent to worker processes.
+    """
+    events = []
+    try:
+        midi_file = MidiFile(file_path)
+        for track in midi_file.tracks:
+            pitches, onsets, releases = _track_notes(track)
+            if not pitches:
+                continue
+            onsets = np.array(onsets, dtype=np.float64) / midi_file.ticks_per_beat
+            releases = np.array(releases, dtype=np.float64) / midi_file.ticks_per_beat
+            codes = rhythm.quantize(np.diff(onsets, prepend=onsets[0]), releases - onsets)
+            events.extend(zip(pitches, codes.tolist()))
+    except Exception as e:
+        return FileEvents(file_path, [], f"{type(e).__name__}: {e}")
+    return FileEvents(file_path, events, None)
+
 
 class MelodyGenerator:
     """
     A class to generate melodies using a Markov chain, trained on MIDI files.
     Returns music21 streams so it integrates directly with chords.
     """
-    def __init__(self):
-        self.chain = {}
-        self.trained_notes = []
+    def __init__(self, order=1, event_cache_dir=None):
+        """
+        Args:
+            order (int): How many previous events each prediction looks at.
+                Contexts unseen in training back off to shorter ones.
+            event_cache_dir (str): Folder for the per-file event cache (see
+                event_cache.py); None parses every file on every training run.
+        """
+        self.order = order
+        self.chain = MarkovChain.from_sequences([], order=order)
+        self.trained_notes = Counter()
+        self.failed_files = []
+        # Events each training file contributed, by absolute path, so files
+        # can later be counted out again by `remove` or `update`. Exact
+        # duplicates are left out here and only listed in `file_digests`,
+        # which maps every successfully read file to its content hash.
+        self.file_events = {}
+        self.file_digests = {}
+        self.event_cache = EventCache(event_cache_dir) if event_cache_dir else None
 
     # -------------------------------
     # Training
     # -------------------------------
-    def train(self, midi_folder_path):
-        """Train the Markov model on all MIDI files in a given folder."""
-        all_events = []
-        print("Starting training...")
-        for filename in os.listdir(midi_folder_path):
-            if filename.lower().endswith(('.mid', '.midi')):
-                file_path = os.path.join(midi_folder_path, filename)
-                print(f"  - Processing {filename}")
-                events_from_song = self._get_musical_events_from_midi(file_path)
-                all_events.extend(events_from_song)
-        
-        self.trained_notes = [e[0] for e in all_events]
-        self.chain = self._build_markov_chain(all_events)
-        print(f"\nTraining complete. Model built from {len(all_events)} events.")
+    def train(self, midi_folder_path, workers=None, digests=None):
+        """
+        Train the Markov model on all MIDI files in a given folder.
+
+        Files whose contents duplicate an earlier file are counted once, and
+        with an `event_cache` only files not seen before are parsed.
+
+        Args:
+            midi_folder_path (str): Folder containing .mid/.midi files.
+            workers (int): Number of worker processes used to parse files.
+                None or 1 parses serially in this process; 0 uses one
+                worker per CPU. Files are always combined in sorted path
+                order, so every setting builds the same chain.
+            digests (dict): Content hashes already known, by absolute path,
+                so those files need not be hashed again.
+        """
+        file_paths = [
+            os.path.abspath(os.path.join(midi_folder_path, filename))
+            for filename in sorted(os.listdir(midi_folder_path))
+            if filename.lower().endswith(('.mid', '.midi'))
+        ]
+        print(f"Starting training on {len(file_paths)} files...")
+        self.failed_files = []
+        self.file_events = {}
+        self.file_digests = {}
+        self._add_files(file_paths, workers, digests)
+
+        with metrics.span("train.build_chain"):
+            sequences = list(self.file_events.values())
+            self.trained_notes = _count_notes(sequences)
+            self.chain = self._build_markov_chain(sequences)
+        duplicates = len(self.file_digests) - len(self.file_events)
+        print(f"\nTraining complete. Model built from {self.trained_notes.total()} events "
+              f"({duplicates} duplicate files skipped, "
+              f"{len(self.failed_files)} of {len(file_paths)} files could not be read).")
+
+    def update(self, paths, workers=None, digests=None):
+        """
+        Adds MIDI files to the trained model, or re-reads ones already in it.
+
+        Only the transitions of the given files are recounted, so this is
+        much cheaper than calling `train` again on the whole folder.
+
+        Args:
+            paths (list): MIDI files to (re)add.
+            workers (int): Worker processes for parsing, as in `train`.
+            digests (dict): Known content hashes by absolute path, as in `train`.
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        removed = self._forget(paths)
+        added = self._add_files(paths, workers, digests)
+        self._apply_changes(added, removed)
+
+    def remove(self, paths):
+        """Counts the given training files back out of the model."""
+        paths = [os.path.abspath(path) for path in paths]
+        self._apply_changes([], self._forget(paths))
+
+    def _add_files(self, paths, workers=None, digests=None):
+        """
+        Reads new training files into `file_events` and `file_digests`.
+
+        A file with the same contents as one already in the model (or earlier
+        in `paths`) is only recorded as a duplicate. Events come from the
+        event cache where possible; only the rest are parsed.
+
+        Returns:
+            list: Event arrays of the files whose contents were new.
+        """
+        digests = digests or {}
+        owners = {self.file_digests[path]: path for path in self.file_events}
+        to_load = []            # first path of each new content hash
+        copies = {}             # digest -> later paths with the same contents
+        for path in paths:
+            digest = digests.get(path)
+            if digest is None:
+                try:
+                    digest = file_sha256(path)
+                except OSError:
+                    digest = path       # unreadable; parsing reports why
+            if digest in owners:
+                self.file_digests[path] = digest
+                metrics.incr("train.duplicates_skipped")
+            elif digest in copies:
+                copies[digest].append(path)
+            else:
+                copies[digest] = []
+                to_load.append((path, digest))
+
+        results, misses = {}, []
+        for path, digest in to_load:
+            events = self.event_cache.get(digest) if self.event_cache is not None else None
+            if events is None:
+                misses.append((path, digest))
+            else:
+                results[path] = FileEvents(path, events, None)
+        metrics.incr("train.event_cache_hits", len(results))
+        metrics.incr("train.event_cache_misses", len(misses))
+
+        with metrics.span("train.parse_files"):
+            parsed = self._read_files([path for path, _ in misses], workers)
+        _count_parsed(parsed)
+        for (path, digest), result in zip(misses, parsed):
+            if result.error is None:
+                result = result._replace(events=_as_event_array(result.events))
+                if self.event_cache is not None and digest != path:
+                    self.event_cache.put(digest, result.events)
+            results[path] = result
+
+        added = []
+        for path, digest in to_load:
+            result = results[path]
+            if result.error is not None:
+                self.failed_files.append(result)
+                self.failed_files.extend(FileEvents(copy, [], result.error) for copy in copies[digest])
+                continue
+            self.file_events[path] = result.events
+            self.file_digests[path] = digest
+            added.append(result.events)
+            for copy in copies[digest]:
+                self.file_digests[copy] = digest
+            metrics.incr("train.duplicates_skipped", len(copies[digest]))
+        return added
+
+    def _forget(self, paths):
+        """
+        Drops training files from `file_events` and `file_digests`.
+
+        When a dropped file has a duplicate still in the corpus, the duplicate
+        takes over its events, so the chain keeps counting them.
+
+        Returns:
+            list: Event arrays to count out of the chain.
+        """
+        gone = set(paths)
+        self.failed_files = [result for result in self.failed_files if result.path not in gone]
+        removed = []
+        for path in paths:
+            digest = self.file_digests.pop(path, None)
+            events = self.file_events.pop(path, None)
+            if events is None:
+                continue
+            copy = next((other for other, d in self.file_digests.items()
+                         if d == digest and other not in self.file_events), None)
+            if copy is None:
+                removed.append(events)
+            else:
+                self.file_events[copy] = events
+        return removed
+
+    def _apply_changes(self, added, removed):
+        if not added and not removed:
+            return
+        with metrics.span("train.update_chain"):
+            self.chain = self.chain.updated(add=added, remove=removed)
+        self.trained_notes.update(_count_notes(added))
+        self.trained_notes.subtract(_count_notes(removed))
+        self.trained_notes = +self.trained_notes     # drop notes no longer seen
 
     # -------------------------------
     # Melody generation
@@ -37,7 +288,7 @@ class MelodyGenerator:
 # PASTE THIS ENTIRE METHOD INSIDE your MelodyGenerator class
 #
 
-    def generate(self, length, key='C', start_note=None, temperature=1.0):
+    def generate(self, length, key='C', start_note=None, temperature=1.0, rng=None):
         """
         Generates a new melody with controllable randomness (temperature).
 
@@ -46,66 +297,133 @@ class MelodyGenerator:
             key (str): The musical key (e.g., 'C' for C Major).
             start_note (int): Optional MIDI note to start on.
             temperature (float): Controls randomness.
+            rng (random.Random): Source of randomness, e.g. random.Random(seed)
+                for a reproducible melody; defaults to the `random` module.
         """
         if not self.chain:
             print("Error: Model not trained. Call .train() first.")
             return None
+        with metrics.span("generate"):
+            melody = list(self.generate_stream(length, key, start_note, temperature, rng))
+        metrics.incr("generate.events", len(melody))
+        return melody
 
-        key_scale = scale.MajorScale(key) if key.isupper() else scale.MinorScale(key)
-        scale_notes = [p.midi for p in key_scale.getPitches()]
+    def generate_stream(self, length=None, key='C', start_note=None, temperature=1.0, rng=None):
+        """
+        Yields the events of a melody one at a time, as `generate` would build them.
+
+        Only the current context is kept in memory, so arbitrarily long
+        melodies can be consumed (e.g. written to disk) as they are produced.
+
+        Args:
+            length (int): Number of steps, as in `generate`; None never stops.
+            key (str): The musical key (e.g., 'C' for C Major).
+            start_note (int): Optional MIDI note to start on.
+            temperature (float): Controls randomness.
+            rng (random.Random): Source of randomness, as in `generate`.
+        """
+        if not self.chain:
+            print("Error: Model not trained. Call .train() first.")
+            return
+
+        rng = rng or random
+        states = self.chain.live_states()
+        fallback_states = self.chain.states_in_pitch_classes(_scale_pitch_classes(key))
+        if not len(fallback_states):
+            fallback_states = states
 
         if start_note and start_note in self.trained_notes:
-            possible_starts = [event for event in self.chain.keys() if event[0] == start_note]
-            current_event = random.choice(possible_starts) if possible_starts else random.choice(list(self.chain.keys()))
+            possible_starts = self.chain.states_with_pitch(start_note)
+            current_state = rng.choice(possible_starts if len(possible_starts) else states)
         else:
-            current_event = random.choice(list(self.chain.keys()))
+            current_state = rng.choice(states)
 
-        melody = [current_event]
+        yield self.chain.event(current_state)
+        history = [current_state]
 
-        for _ in range(length - 1):
-            possible_next_events = self.chain.get(current_event)
-            if not possible_next_events:
-                fallback_events = [ev for ev in self.chain.keys() if ev[0] in scale_notes]
-                current_event = random.choice(fallback_events if fallback_events else list(self.chain.keys()))
+        steps = itertools.count() if length is None else range(length - 1)
+        for _ in steps:
+            next_state = self.chain.sample_context(history, temperature, rng)
+            if next_state is None:
+                # Restart the context from an in-key state; it is not added to the melody.
+                metrics.incr("generate.dead_ends")
+                history = [rng.choice(fallback_states)]
             else:
-                # Use a helper method for temperature-based selection if you have one
-                # For simplicity, this version uses basic random choice. You can add the
-                # more complex temperature logic back in if you have it.
-                next_event = random.choice(possible_next_events)
-                melody.append(next_event)
-                current_event = next_event
-        return melody
+                yield self.chain.event(next_state)
+                history = history[1 - self.order:] + [next_state] if self.order > 1 else [next_state]
+
+    def generate_batch(self, n, length, key='C', temperature=1.0, seed=None, as_ids=False):
+        """
+        Generates `n` independent melodies at once, advancing all chains together.
+
+        Unlike `generate`, a dead end jumps to a random in-key state and that
+        state is kept, so every melody has exactly `length` events.
+
+        Args:
+            n (int): Number of melodies.
+            length (int): Number of events per melody.
+            key (str): The musical key (e.g., 'C' for C Major, 'a' for A minor).
+            temperature (float): Controls randomness.
+            seed (int): Seed for a reproducible batch.
+            as_ids (bool): Return state IDs instead of event values.
+
+        Returns:
+            np.ndarray: (n, length) state IDs, or (n, length, 2) (pitch, rhythm)
+            events, the rhythm being a code of the grid in rhythm.py.
+        """
+        if not self.chain:
+            print("Error: Model not trained. Call .train() first.")
+            return None
+
+        rng = np.random.default_rng(seed)
+        states = self.chain.live_states()
+        fallback_states = self.chain.states_in_pitch_classes(_scale_pitch_classes(key))
+        if not len(fallback_states):
+            fallback_states = states
+
+        ids = np.empty((n, length), dtype=np.int64)
+        if length == 0:
+            return ids if as_ids else self.chain.events[ids]
+        ids[:, 0] = rng.choice(states, n)
+        # Step at which each chain's current context began (reset on dead ends).
+        context_start = np.zeros(n, dtype=np.int64)
+        for step in range(1, length):
+            if self.order == 1:
+                next_ids = self.chain.sample_many(ids[:, step - 1], rng.random(n), temperature)
+            else:
+                first = max(0, step - self.order)
+                history = ids[:, first:step].copy()
+                history[np.arange(first, step) < context_start[:, None]] = -1
+                next_ids = self.chain.sample_context_many(history, rng.random(n), temperature)
+            dead = next_ids < 0
+            if dead.any():
+                next_ids[dead] = rng.choice(fallback_states, int(dead.sum()))
+                context_start[dead] = step
+            ids[:, step] = next_ids
+        return ids if as_ids else self.chain.events[ids]
 
     # -------------------------------
     # Private helpers
     # -------------------------------
-    def _get_musical_events_from_midi(self, file_path):
-        """Extracts (note, time) tuples from a MIDI file."""
-        events = []
-        try:
-            midi_file = MidiFile(file_path)
-            for track in midi_file.tracks:
-                for msg in track:
-                    if msg.type == 'note_on' and msg.velocity > 0:
-                        event = (msg.note, msg.time)
-                        events.append(event)
-        except Exception as e:
-            print(f"Could not read file {file_path}: {e}")
-        return events
-
-    def _build_markov_chain(self, events):
-        """Builds the transition model from a list of events."""
-        chain = {}
-        for i in range(len(events) - 1):
-            current_event = events[i]
-            next_event = events[i+1]
-            if current_event not in chain:
-                chain[current_event] = []
-            chain[current_event].append(next_event)
-        return chain
+    def _read_files(self, file_paths, workers=None):
+        """Reads every file into a FileEvents result, in the order given."""
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        if not workers or workers <= 1 or len(file_paths) <= 1:
+            return [_read_midi_events(path) for path in file_paths]
+        # Executor.map yields results in submission order, whatever order
+        # the workers finish in.
+        chunksize = max(1, len(file_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_read_midi_events, file_paths, chunksize=chunksize))
+
+    def _build_markov_chain(self, sequences):
+        """Builds the transition model from per-file lists of events."""
+        return MarkovChain.from_sequences(sequences, order=self.order)
 
     def _fallback_scale_melody(self, num_bars, key, mode):
         """Fallback if training data is missing → simple scale melody."""
+        from music21 import stream, note, scale
         melody = stream.Part()
         key_scale = scale.MajorScale(key) if mode == "major" else scale.MinorScale(key)
         scale_notes = [p.midi for p in key_scale.getPitches()]
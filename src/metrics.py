@@ -0,0 +1,197 @@
+"""
+Metrics Module
+--------------
+Lightweight timing and counting for the composition pipeline.
+
+    with metrics.span("export.midi"):      # time one stage
+        ...
+    metrics.incr("generate.dead_ends")     # count something
+
+Spans keep a call count, total and maximum time per name; counters are
+plain integers. Both are off unless MUSIC_METRICS=1 is set or `enable()`
+is called; while off, `span` hands back one shared no-op context manager
+and `incr` returns at once, so instrumented hot paths cost about a
+function call.
+
+`profile()` wraps a block in cProfile (or pyinstrument, if installed and
+asked for) for a full call-level picture when spans are not enough.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_enabled = os.getenv("MUSIC_METRICS", "") not in ("", "0")
+_lock = threading.Lock()
+_spans = {}        # name -> [count, total_s, max_s]
+_counters = {}     # name -> int
+
+
+def enable(on=True):
+    """Turns collection on (or off with on=False)."""
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    return _enabled
+
+
+# -------------------------------
+# Spans and counters
+# -------------------------------
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    """Context manager timing a block under `name` (a no-op while disabled)."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def incr(name, n=1):
+    """Adds `n` to the counter `name` (a no-op while disabled)."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name, seconds):
+    """Records one timing measured elsewhere under the span `name` (a no-op while disabled)."""
+    if _enabled:
+        _record(name, seconds)
+
+
+def _record(name, seconds):
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            _spans[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+
+# -------------------------------
+# Reading, merging and resetting
+# -------------------------------
+def snapshot():
+    """
+    Current values as plain data (JSON-ready):
+    {'enabled', 'spans': {name: {'count', 'total_ms', 'mean_ms', 'max_ms'}}, 'counters': {...}}.
+    """
+    with _lock:
+        spans = {
+            name: {"count": count, "total_ms": total * 1e3, "mean_ms": total * 1e3 / count, "max_ms": peak * 1e3}
+            for name, (count, total, peak) in sorted(_spans.items())
+        }
+        counters = dict(sorted(_counters.items()))
+    return {"enabled": _enabled, "spans": spans, "counters": counters}
+
+
+def merge(other):
+    """Adds a `snapshot()` taken elsewhere (e.g. in a worker process) into this one."""
+    for name, stats in other.get("spans", {}).items():
+        with _lock:
+            current = _spans.setdefault(name, [0, 0.0, 0.0])
+            current[0] += stats["count"]
+            current[1] += stats["total_ms"] / 1e3
+            current[2] = max(current[2], stats["max_ms"] / 1e3)
+    for name, value in other.get("counters", {}).items():
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def reset():
+    """Forgets every span and counter."""
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def report():
+    """Human-readable table of the current spans and counters."""
+    data = snapshot()
+    lines = [f"{'span':<32} {'calls':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+    for name, s in data["spans"].items():
+        lines.append(f"{name:<32} {s['count']:>6} {s['total_ms']:>10.1f} {s['mean_ms']:>9.2f} {s['max_ms']:>9.2f}")
+    if data["counters"]:
+        lines.append("")
+        lines.append(f"{'counter':<32} {'value':>10}")
+        lines.extend(f"{name:<32} {value:>10}" for name, value in data["counters"].items())
+    return "\n".join(lines)
+
+
+# -------------------------------
+# Profiling
+# -------------------------------
+@contextmanager
+def profile(output=None, profiler="cprofile", top=25):
+    """
+    Profiles the block.
+
+    Args:
+        output (str): File for the results: cProfile stats (open with
+            pstats or snakeviz), or an HTML report for pyinstrument. None
+            prints the `top` functions by cumulative time instead.
+        profiler (str): 'cprofile' or 'pyinstrument' (optional dependency).
+    """
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise RuntimeError("pyinstrument is not installed (pip install pyinstrument)")
+        p = Profiler()
+        p.start()
+        try:
+            yield
+        finally:
+            p.stop()
+            if output:
+                with open(output, "w") as f:
+                    f.write(p.output_html())
+            else:
+                print(p.output_text(unicode=True, color=False))
+        return
+
+    import cProfile
+    import pstats
+
+    p = cProfile.Profile()
+    p.enable()
+    try:
+        yield
+    finally:
+        p.disable()
+        if output:
+            p.dump_stats(output)
+        else:
+            pstats.Stats(p).sort_stats("cumulative").print_stats(top)
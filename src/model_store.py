@@ -0,0 +1,375 @@
+"""
+Model Store Module
+------------------
+Saves a trained MelodyGenerator to a compact binary file and loads it back.
+Each file records a fingerprint of the training corpus (file names, sizes,
+mtimes and content hashes) so a cached model is only reused while the corpus
+is unchanged. When only some files changed, the cached model is updated
+incrementally with just those files instead of being retrained, and a full
+retrain only parses files missing from the per-file event cache kept next
+to the model (see event_cache.py).
+
+`save_shared` / `attach_shared` write and memory-map a read-only copy of
+the model that several worker processes can share.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+import metrics
+from event_cache import EventCache, file_sha256
+from markov_chain import MarkovChain, TransitionTable
+
+# Bump whenever the layout of the saved arrays changes; files written with
+# another version are ignored and the model is rebuilt.
+FORMAT_VERSION = 7
+
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
+
+# -------------------------------
+# Corpus fingerprint
+# -------------------------------
+def scan_corpus(midi_folder_path, previous=None):
+    """
+    Lists the MIDI files of a corpus as (name, size, mtime_ns, sha256) entries.
+
+    Args:
+        midi_folder_path (str): Folder containing the training files.
+        previous (list): Manifest from an earlier scan. Content hashes are
+            reused for files whose name, size and mtime are unchanged, so a
+            warm start only has to stat the corpus.
+    """
+    known = {}
+    for name, size, mtime_ns, digest in previous or []:
+        known[(name, size, mtime_ns)] = digest
+
+    manifest = []
+    for filename in sorted(os.listdir(midi_folder_path)):
+        if not filename.lower().endswith(MIDI_EXTENSIONS):
+            continue
+        stat = os.stat(os.path.join(midi_folder_path, filename))
+        digest = known.get((filename, stat.st_size, stat.st_mtime_ns))
+        if digest is None:
+            digest = file_sha256(os.path.join(midi_folder_path, filename))
+        manifest.append((filename, stat.st_size, stat.st_mtime_ns, digest))
+    return manifest
+
+
+def corpus_fingerprint(manifest):
+    """Single hex digest identifying a whole corpus manifest."""
+    h = hashlib.sha256()
+    for name, size, mtime_ns, digest in manifest:
+        h.update(f"{name}\0{size}\0{mtime_ns}\0{digest}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+# -------------------------------
+# Save / load
+# -------------------------------
+def save_model(generator, path, manifest):
+    """Writes the generator's trained chain to `path` (.npz, uncompressed)."""
+    chain = generator.chain
+    meta = {
+        'version': FORMAT_VERSION,
+        'fingerprint': corpus_fingerprint(manifest),
+        'order': chain.order,
+        'manifest': manifest,
+        'files': list(generator.file_events),
+        'digests': generator.file_digests,
+    }
+    arrays = {}
+    for level, table in enumerate(chain.tables, start=1):
+        arrays[f'offsets_{level}'] = table.offsets
+        arrays[f'successors_{level}'] = table.successors
+        arrays[f'counts_{level}'] = table.counts
+    for level, keys in enumerate(chain.context_keys, start=2):
+        arrays[f'context_keys_{level}'] = keys
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    # A temp file of its own for every writer: the CLI and the web app may
+    # save the same cache at the same time.
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps(meta)),
+                events=chain.events,
+                note_counts=np.array([generator.trained_notes.get(n, 0) for n in range(128)], dtype=np.int64),
+                file_lengths=np.array([len(e) for e in generator.file_events.values()], dtype=np.int64),
+                file_events=np.concatenate(list(generator.file_events.values()) or [np.zeros((0, 2), np.int32)]),
+                **arrays,
+            )
+        # Replace atomically so a concurrent reader never sees a partial file.
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_manifest(path):
+    """Returns the (version, manifest) stored in a model file, or (None, None)."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+    except (OSError, KeyError, ValueError):
+        return None, None
+    return meta.get('version'), [tuple(entry) for entry in meta.get('manifest', [])]
+
+
+def load_model(generator, path, fingerprint):
+    """
+    Loads a saved chain into `generator` if it matches `fingerprint`.
+    A `fingerprint` of None accepts a model of any corpus.
+
+    Returns:
+        bool: True if the model was loaded, False if the file is missing,
+        unreadable, from another format version, for another corpus or of
+        another order than `generator.order`.
+    """
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if (meta.get('version') != FORMAT_VERSION or meta.get('order') != generator.order
+                    or fingerprint is not None and meta.get('fingerprint') != fingerprint):
+                return False
+            order = meta['order']
+            tables = [
+                TransitionTable(data[f'offsets_{level}'], data[f'successors_{level}'],
+                                data[f'counts_{level}'])
+                for level in range(1, order + 1)
+            ]
+            context_keys = [data[f'context_keys_{level}'] for level in range(2, order + 1)]
+            chain = MarkovChain(data['events'], tables, context_keys)
+            trained_notes = Counter({n: c for n, c in enumerate(data['note_counts'].tolist()) if c})
+            splits = np.cumsum(data['file_lengths'])[:-1]
+            file_events = dict(zip(meta['files'], np.split(data['file_events'], splits)))
+    except (OSError, KeyError, ValueError):
+        return False
+
+    generator.chain = chain
+    generator.trained_notes = trained_notes
+    generator.file_events = file_events
+    generator.file_digests = meta['digests']
+    return True
+
+
+# -------------------------------
+# Shared read-only model
+# -------------------------------
+# Pointer file naming the current version folder of a shared model.
+SHARED_POINTER = 'CURRENT'
+# Superseded version folders kept for processes that may still be attaching.
+SHARED_KEEP = 2
+
+
+def save_shared(generator, directory, temperatures=(1.0,)):
+    """
+    Publishes the trained chain as a folder of flat .npy arrays (events, and
+    per context level the offsets, successors, counts and cumulative
+    sampling weights) that `attach_shared` memory-maps read-only.
+
+    Every process attached to the same model shares one physical copy of
+    the arrays through the page cache, and attaching reads no data up front.
+
+    Each model is written once, to a version folder named after its
+    contents, and `directory`/CURRENT is then replaced atomically to point
+    at it. Several processes may publish at once: a version someone else
+    already published is simply reused, and processes still mapping an
+    older version keep working on it.
+
+    Args:
+        directory (str): Folder holding the versions and the pointer.
+        temperatures (tuple): Temperatures whose cumulative weights are
+            stored; generating at any other temperature computes them in the
+            process that asks.
+
+    Returns:
+        str: The version folder now current.
+    """
+    chain = generator.chain
+    temperatures = sorted({float(t) for t in temperatures} | {1.0})
+    note_counts = np.array([generator.trained_notes.get(n, 0) for n in range(128)], dtype=np.int64)
+    meta = {'version': FORMAT_VERSION, 'order': chain.order, 'temperatures': temperatures}
+    version_key = hashlib.sha256(
+        f"{chain.fingerprint()}{meta}".encode('utf-8') + note_counts.tobytes()).hexdigest()
+    name = f"v{FORMAT_VERSION}-{version_key[:16]}"
+
+    directory = os.path.abspath(directory)
+    version_dir = os.path.join(directory, name)
+    os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(os.path.join(version_dir, 'meta.json')):
+        tmp_dir = tempfile.mkdtemp(dir=directory, prefix='.tmp-')
+        try:
+            arrays = {'events': chain.events, 'note_counts': note_counts}
+            for level, table in enumerate(chain.tables, start=1):
+                arrays[f'offsets_{level}'] = table.offsets
+                arrays[f'successors_{level}'] = table.successors
+                arrays[f'counts_{level}'] = table.counts
+                for index, temperature in enumerate(temperatures):
+                    arrays[f'cumulative_{level}_{index}'] = table.cumulative_for(temperature)
+            for level, keys in enumerate(chain.context_keys, start=2):
+                arrays[f'context_keys_{level}'] = keys
+            for array_name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f'{array_name}.npy'), np.ascontiguousarray(array))
+            # meta.json last: a folder without it is never attached.
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp_dir, version_dir)
+            except OSError:
+                # Another process published the same version first
+                if not os.path.exists(os.path.join(version_dir, 'meta.json')):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    fd, tmp_pointer = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.pointer')
+    with os.fdopen(fd, 'w') as f:
+        f.write(name)
+    os.replace(tmp_pointer, os.path.join(directory, SHARED_POINTER))
+    _prune_shared(directory, name)
+    return version_dir
+
+
+def _prune_shared(directory, current):
+    """Removes all but the SHARED_KEEP newest superseded version folders."""
+    versions = []
+    for entry in os.scandir(directory):
+        if entry.is_dir() and entry.name.startswith('v') and entry.name != current:
+            try:
+                versions.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+    for _, path in sorted(versions, reverse=True)[SHARED_KEEP:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def attach_shared(generator, directory):
+    """
+    Memory-maps the current model published by `save_shared` into `generator`.
+
+    The chain's arrays are read-only views of the files; `generate` and
+    `generate_batch` sample from them directly. Training calls (`update`,
+    `remove`) still work but build a private in-memory chain.
+
+    Returns:
+        bool: True if attached, False if nothing is published, the version
+        is incomplete, from another format version or of another order than
+        `generator.order`.
+    """
+    try:
+        with open(os.path.join(directory, SHARED_POINTER)) as f:
+            version_dir = os.path.join(directory, f.read().strip())
+    except OSError:
+        return False
+
+    def mapped(name):
+        return np.load(os.path.join(version_dir, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+
+    try:
+        with open(os.path.join(version_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION or meta.get('order') != generator.order:
+            return False
+        order, temperatures = meta['order'], meta['temperatures']
+        tables = [
+            TransitionTable(mapped(f'offsets_{level}'), mapped(f'successors_{level}'),
+                            mapped(f'counts_{level}'),
+                            {t: mapped(f'cumulative_{level}_{i}') for i, t in enumerate(temperatures)})
+            for level in range(1, order + 1)
+        ]
+        context_keys = [mapped(f'context_keys_{level}') for level in range(2, order + 1)]
+        chain = MarkovChain(mapped('events'), tables, context_keys)
+        note_counts = mapped('note_counts')
+    except (OSError, KeyError, ValueError):
+        return False
+
+    generator.chain = chain
+    generator.trained_notes = Counter({n: c for n, c in enumerate(note_counts.tolist()) if c})
+    generator.file_events = {}
+    generator.file_digests = {}
+    return True
+
+
+def sync_corpus(generator, midi_folder_path, previous, manifest, workers=None):
+    """
+    Brings a loaded model up to date with the corpus by diffing manifests.
+
+    Files that are new or whose content hash changed are re-read with
+    `generator.update`; files that disappeared are counted out with
+    `generator.remove`.
+
+    Returns:
+        tuple: Numbers of (updated, removed) files.
+    """
+    previous_digests = {name: digest for name, _, _, digest in previous or []}
+    current = {
+        os.path.abspath(os.path.join(midi_folder_path, name)): digest
+        for name, _, _, digest in manifest
+    }
+    changed = {
+        path for path, digest in current.items()
+        if previous_digests.get(os.path.basename(path)) != digest
+    }
+    to_update = sorted(path for path in current if path in changed or path not in generator.file_digests)
+    to_remove = [path for path in generator.file_digests if path not in current]
+
+    generator.remove(to_remove)
+    generator.update(to_update, workers=workers, digests=current)
+    return len(to_update), len(to_remove)
+
+
+def load_or_train(generator, midi_folder_path, cache_path, workers=None):
+    """
+    Loads the cached model for this corpus, or trains and caches a new one.
+
+    A cache written for an earlier state of the corpus is updated with only
+    the files that changed. A generator without an event cache is given one
+    in an "events" folder next to `cache_path`.
+
+    Returns:
+        bool: True if the cached model was used, with or without an update.
+    """
+    with metrics.span("model.scan_corpus"):
+        version, previous = read_manifest(cache_path)
+        if version != FORMAT_VERSION:
+            previous = None
+        manifest = scan_corpus(midi_folder_path, previous)
+        fingerprint = corpus_fingerprint(manifest)
+    if generator.event_cache is None:
+        generator.event_cache = EventCache(os.path.join(os.path.dirname(os.path.abspath(cache_path)), 'events'))
+
+    with metrics.span("model.load"):
+        loaded = load_model(generator, cache_path, fingerprint)
+    if loaded:
+        metrics.incr("model.cache_hits")
+        print(f"Loaded cached model from {cache_path}")
+        return True
+
+    if previous is not None and load_model(generator, cache_path, None):
+        metrics.incr("model.cache_updates")
+        updated, removed = sync_corpus(generator, midi_folder_path, previous, manifest, workers)
+        with metrics.span("model.save"):
+            save_model(generator, cache_path, manifest)
+        print(f"Updated cached model in {cache_path} "
+              f"({updated} files added or changed, {removed} removed)")
+        return True
+
+    metrics.incr("model.cache_misses")
+    with metrics.span("train"):
+        digests = {os.path.abspath(os.path.join(midi_folder_path, name)): digest
+                   for name, _, _, digest in manifest}
+        generator.train(midi_folder_path, workers=workers, digests=digests)
+    with metrics.span("model.save"):
+        save_model(generator, cache_path, manifest)
+    print(f"Saved model cache to {cache_path}")
+    return False
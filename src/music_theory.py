@@ -0,0 +1,62 @@
+"""
+Music Theory Module
+-------------------
+The little scale arithmetic the generators need, without importing music21
+(which takes most of a second to load). Spellings and octaves follow
+music21: the tonic sits in octave 4, degrees are spelled on consecutive
+letters, and flats are written '-' (e.g. "B-4").
+"""
+
+from functools import lru_cache
+
+LETTERS = "CDEFGAB"
+NATURAL_PITCH_CLASSES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+# Semitones above the tonic of each degree (minor is the natural minor).
+SCALE_STEPS = {
+    "major": (0, 2, 4, 5, 7, 9, 11),
+    "minor": (0, 2, 3, 5, 7, 8, 10),
+}
+
+
+def parse_tonic(name):
+    """
+    Splits a tonic such as 'F#', 'b-' or 'Bb' into (letter, alter in semitones).
+
+    Raises:
+        ValueError: If `name` is not a note letter followed by '#', '-' or 'b' signs.
+    """
+    letter, signs = name[:1].upper(), name[1:]
+    if letter not in NATURAL_PITCH_CLASSES or signs.strip("#-b"):
+        raise ValueError(f"Not a key name: {name!r}")
+    return letter, signs.count("#") - signs.count("-") - signs.count("b")
+
+
+@lru_cache(maxsize=None)
+def scale_degrees(tonic, mode="major"):
+    """
+    The seven degrees of a scale as (name_with_octave, midi) pairs, tonic first.
+
+    Args:
+        tonic (str): Key letter with optional accidentals, any case.
+        mode (str): 'major' or 'minor'.
+    """
+    letter, alter = parse_tonic(tonic)
+    start = LETTERS.index(letter)
+    tonic_pc = NATURAL_PITCH_CLASSES[letter] + alter
+    degrees = []
+    for degree, step in enumerate(SCALE_STEPS[mode.lower()]):
+        degree_letter = LETTERS[(start + degree) % 7]
+        octave = 4 + (start + degree) // 7
+        natural = NATURAL_PITCH_CLASSES[degree_letter]
+        # Signed distance from the letter's natural note, in -6..5
+        degree_alter = (tonic_pc + step - natural + 6) % 12 - 6
+        accidental = "#" * degree_alter if degree_alter > 0 else "-" * -degree_alter
+        degrees.append((f"{degree_letter}{accidental}{octave}", (octave + 1) * 12 + natural + degree_alter))
+    return tuple(degrees)
+
+
+@lru_cache(maxsize=None)
+def scale_pitch_classes(tonic, mode="major"):
+    """Pitch classes (0-11) of a major or minor scale."""
+    return frozenset(midi % 12 for _, midi in scale_degrees(tonic, mode))
@@ -0,0 +1,67 @@
+"""
+Password Hasher Module
+----------------------
+Runs bcrypt hashing and checking on a small, dedicated thread pool so a
+burst of logins cannot take every CPU away from the other routes.
+
+At most `workers` hashes run at once (bcrypt releases the GIL, so threads
+are enough), and at most `max_pending` may be running or waiting. Past that
+the call fails at once with HasherBusy, which the API turns into a 429,
+instead of queueing work the client would time out on anyway.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# bcrypt's own default cost; each +1 doubles the time per hash.
+DEFAULT_ROUNDS = 12
+
+
+class HasherBusy(Exception):
+    """Raised when `max_pending` hashing calls are already running or waiting."""
+
+
+class PasswordHasher:
+    """
+    Bounded executor for bcrypt.
+
+    Args:
+        rounds (int): bcrypt cost factor for new hashes (4-31). Existing
+            hashes keep the cost they were made with.
+        workers (int): Hashes computed at the same time.
+        max_pending (int): Calls that may be running or waiting at once.
+        timeout (float): Seconds a caller waits for its result.
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=2, max_pending=16, timeout=10.0):
+        if not 4 <= rounds <= 31:
+            raise ValueError("bcrypt rounds must be between 4 and 31")
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def hash(self, password):
+        """Returns the bcrypt hash (bytes) of a str password."""
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+
+    def check(self, password, hashed):
+        """True if the str password matches a hash made by `hash`."""
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Too many password checks in progress")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is freed when the hash finishes, even if the caller gave up waiting.
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
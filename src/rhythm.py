@@ -0,0 +1,121 @@
+"""
+Rhythm Module
+-------------
+Quantized timing for melody events. Every event is a (pitch, rhythm) pair
+whose rhythm code packs two grid values, both measured in beats (quarter
+notes) so files with different MIDI resolutions (ticks_per_beat) agree:
+
+    delta     time since the previous note of the track started (0 = together)
+    duration  time from the note's note_on to its paired note_off
+
+Each is snapped to the nearest of a small set of musical values (straight
+and triplet subdivisions up to a whole note), so the thousands of raw tick
+values in a corpus collapse to DELTAS x DURATIONS rhythm codes and the
+Markov chain has far fewer, far better-connected states.
+
+    code = delta_index * len(DURATIONS) + duration_index
+"""
+
+import numpy as np
+
+# Grid values in beats. Gaps shorter than DELTA_EPSILON count as 0 (notes
+# struck together, e.g. a rolled chord).
+DELTAS = (0.0, 1 / 8, 1 / 6, 1 / 4, 1 / 3, 1 / 2, 2 / 3, 3 / 4, 1.0, 1.5, 2.0, 3.0, 4.0)
+DURATIONS = (1 / 8, 1 / 6, 1 / 4, 1 / 3, 1 / 2, 2 / 3, 3 / 4, 1.0, 1.5, 2.0, 3.0, 4.0)
+DELTA_EPSILON = 1 / 16
+
+# Number of rhythm codes; valid codes are 0 .. CODES - 1.
+CODES = len(DELTAS) * len(DURATIONS)
+
+# Code of a plain eighth note following the previous one.
+EIGHTH = DELTAS.index(1 / 2) * len(DURATIONS) + DURATIONS.index(1 / 2)
+
+
+def _snap(values, grid):
+    """Index of the nearest grid value for each value, by ratio (log distance)."""
+    grid = np.asarray(grid)
+    bounds = np.sqrt(grid[:-1] * grid[1:])        # geometric midpoints
+    return np.searchsorted(bounds, values)
+
+
+def quantize(deltas, durations):
+    """
+    Rhythm codes for onset gaps and note lengths given in beats.
+
+    Args:
+        deltas (array-like): Beats since the previous onset (>= 0).
+        durations (array-like): Note lengths in beats (> 0).
+
+    Returns:
+        np.ndarray: int32 rhythm codes.
+    """
+    deltas = np.asarray(deltas, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    delta_index = np.where(deltas < DELTA_EPSILON, 0,
+                           1 + _snap(np.maximum(deltas, DELTA_EPSILON), DELTAS[1:]))
+    duration_index = _snap(np.maximum(durations, 1e-9), DURATIONS)
+    return (delta_index * len(DURATIONS) + duration_index).astype(np.int32)
+
+
+def decode(code):
+    """
+    The (delta, duration) in beats of one rhythm code.
+
+    Raises:
+        ValueError: If `code` is not a rhythm code, e.g. a raw MIDI tick
+            delta from a composition stored before the rhythm grid.
+    """
+    code = int(code)
+    if not 0 <= code < CODES:
+        raise ValueError(f"{code} is not a rhythm code (0-{CODES - 1})")
+    delta_index, duration_index = divmod(code, len(DURATIONS))
+    return DELTAS[delta_index], DURATIONS[duration_index]
+
+
+def timeline(events, beats=None):
+    """
+    Lays melody events out as a single line, lazily.
+
+    Each note starts `delta` beats after the previous note's start, or when
+    the previous note ends if that is later (a melody plays one note at a
+    time, so chord tones become a quick run), and lasts `duration` beats.
+
+    Args:
+        beats (float): Optional total length; notes starting at or after it
+            are dropped and the last one is cut off there.
+
+    Yields:
+        tuple: (pitch, start, length) with start and length in beats.
+    """
+    start = end = None
+    for pitch, code in events:
+        delta, duration = decode(code)
+        start = 0.0 if start is None else max(start + delta, end)
+        end = start + duration
+        if beats is not None:
+            if start >= beats:
+                return
+            duration = min(duration, beats - start)
+        yield int(pitch), start, duration
+
+
+def fit(events, beats):
+    """
+    Takes events from an iterable until their `timeline` fills `beats`.
+
+    Consumes no more of `events` than needed, so it can cut an endless
+    `MelodyGenerator.generate_stream` to length.
+
+    Returns:
+        list: The events that start before `beats`.
+    """
+    melody = []
+    start = end = None
+    for pitch, code in events:
+        delta, duration = decode(code)
+        start = 0.0 if start is None else max(start + delta, end)
+        if start >= beats:
+            break
+        end = start + duration
+        melody.append((pitch, code))
+    return melody
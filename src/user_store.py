@@ -0,0 +1,210 @@
+"""
+User Store Module
+-----------------
+Where the web app keeps its user accounts. Two backends share one small
+interface (`find`, `create`, `ensure_indexes`, `close`):
+
+    MongoUserStore   - production; a pooled MongoClient, opened on first use,
+                       and a unique index on username.
+    SQLiteUserStore  - in-process stand-in with the same behaviour, so the
+                       app, benchmarks and concurrency checks run offline.
+
+Registration is a single insert that either succeeds or raises UserExists;
+the unique index (or UNIQUE constraint) decides, so two concurrent sign-ups
+for one name cannot both win. Without that index registration is refused.
+An index the server rejects (existing duplicate usernames) is reported
+once and not retried; one that failed because the server was unreachable
+is retried, by lookups at most every INDEX_RETRY_SECONDS.
+"""
+
+import sqlite3
+import threading
+import time
+
+# How often lookups retry an index build that failed for a transient reason.
+INDEX_RETRY_SECONDS = 30.0
+
+
+class UserStoreError(Exception):
+    """The backing database could not be reached or rejected the operation."""
+
+
+class UserExists(UserStoreError):
+    """Raised by `create` when the username is already taken."""
+
+
+# -------------------------------
+# MongoDB
+# -------------------------------
+class MongoUserStore:
+    """
+    Users in a MongoDB collection.
+
+    Args:
+        uri (str): MongoDB connection string.
+        db_name (str): Database holding the 'users' collection.
+        max_pool_size (int): Most connections the client keeps open; requests
+            beyond it wait up to `wait_queue_timeout_ms` for a free one.
+        min_pool_size (int): Connections kept open even when idle.
+        timeout_ms (int): Server selection and connect timeout.
+    """
+
+    def __init__(self, uri, db_name='music_app', max_pool_size=50, min_pool_size=0,
+                 wait_queue_timeout_ms=2000, timeout_ms=5000):
+        self.uri = uri
+        self.db_name = db_name
+        self.client_options = dict(
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxIdleTimeMS=60000,
+            waitQueueTimeoutMS=wait_queue_timeout_ms,
+            serverSelectionTimeoutMS=timeout_ms,
+            connectTimeoutMS=timeout_ms,
+        )
+        # pymongo is imported and the client opened on first use, so merely
+        # importing the web app neither loads the driver nor dials the server.
+        self.client = None
+        self.users = None
+        self._indexed = False
+        self._index_error = None        # set when the server rejects the index for good
+        self._index_retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _collection(self):
+        if self.users is None:
+            with self._lock:
+                if self.users is None:
+                    from pymongo import MongoClient
+                    self.client = MongoClient(self.uri, **self.client_options)
+                    self.users = self.client[self.db_name]['users']
+        return self.users
+
+    def ensure_indexes(self):
+        """
+        Creates the unique username index (a no-op if it already exists).
+
+        Raises:
+            UserStoreError: If the index cannot be built. When the server
+                rejects it (e.g. duplicate usernames are already stored) the
+                error is printed once and raised again on every later call
+                without another attempt.
+        """
+        from pymongo.errors import OperationFailure, PyMongoError
+
+        users = self._collection()
+        with self._lock:
+            if self._indexed:
+                return
+            if self._index_error is not None:
+                raise UserStoreError(self._index_error)
+            try:
+                users.create_index('username', unique=True, name='username_unique')
+            except OperationFailure as e:
+                # Not a connection problem: retrying cannot succeed until
+                # someone fixes the data or the existing index.
+                if e.code in (11000, 11001):
+                    reason = "duplicate usernames must be resolved before users can register"
+                else:
+                    reason = "users cannot register until it exists"
+                self._index_error = (f"Cannot build the unique index on {self.db_name}.users.username; "
+                                     f"{reason} ({e})")
+                print(f"User store: {self._index_error}")
+                raise UserStoreError(self._index_error) from e
+            except PyMongoError as e:
+                self._index_retry_at = time.monotonic() + INDEX_RETRY_SECONDS
+                raise UserStoreError(str(e)) from e
+            self._indexed = True
+
+    def find(self, username):
+        """Returns {'username', 'password'} for a user, or None."""
+        from pymongo.errors import PyMongoError
+
+        # Make sure lookups are index seeks, not collection scans; they still
+        # work (just slower) if the index cannot be built, and do not try
+        # again after a permanent failure.
+        if not self._indexed and self._index_error is None and time.monotonic() >= self._index_retry_at:
+            try:
+                self.ensure_indexes()
+            except UserStoreError:
+                pass
+        try:
+            return self._collection().find_one({'username': username}, {'_id': 0, 'username': 1, 'password': 1})
+        except PyMongoError as e:
+            raise UserStoreError(str(e)) from e
+
+    def create(self, username, password_hash):
+        """Inserts a user in one round-trip; raises UserExists if the name is taken."""
+        from pymongo.errors import DuplicateKeyError, PyMongoError
+
+        # The unique index is what makes the insert safe against races.
+        self.ensure_indexes()
+        try:
+            self._collection().insert_one({'username': username, 'password': password_hash})
+        except DuplicateKeyError as e:
+            raise UserExists(username) from e
+        except PyMongoError as e:
+            raise UserStoreError(str(e)) from e
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+
+
+# -------------------------------
+# SQLite stand-in
+# -------------------------------
+class SQLiteUserStore:
+    """
+    Users in an SQLite table, for running without a MongoDB server.
+
+    Args:
+        path (str): Database file, or ':memory:' for a private in-memory store.
+    """
+
+    def __init__(self, path=':memory:'):
+        # One shared connection; the lock serialises access across request threads.
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._lock = threading.Lock()
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """Creates the users table; its primary key doubles as the unique username index."""
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password BLOB NOT NULL
+                ) WITHOUT ROWID;
+            """)
+
+    def find(self, username):
+        """Returns {'username', 'password'} for a user, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT username, password FROM users WHERE username = ?", (username,)).fetchone()
+        return {'username': row[0], 'password': row[1]} if row else None
+
+    def create(self, username, password_hash):
+        """Inserts a user; raises UserExists if the name is taken."""
+        try:
+            with self._lock, self.conn:
+                self.conn.execute("INSERT INTO users (username, password) VALUES (?, ?)",
+                                  (username, password_hash))
+        except sqlite3.IntegrityError as e:
+            raise UserExists(username) from e
+
+    def close(self):
+        self.conn.close()
+
+
+def open_user_store(uri, **options):
+    """
+    Opens the store a URI names: 'sqlite:///path/to/users.db', 'sqlite://'
+    (in memory), or a MongoDB connection string. `options` go to the
+    MongoUserStore constructor.
+    """
+    if uri and uri.startswith('sqlite:'):
+        # sqlite:///users.db is relative, sqlite:////var/users.db absolute
+        path = uri[len('sqlite:///'):] if uri.startswith('sqlite:///') else ''
+        return SQLiteUserStore(path or ':memory:')
+    return MongoUserStore(uri, **options)
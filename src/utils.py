@@ -1,7 +1,11 @@
 # src/utils.py
 import os, platform, subprocess
 from pathlib import Path
-from mido import MidiFile, MidiTrack, Message
+import struct
+from mido import MidiFile, MidiTrack, Message, MetaMessage, bpm2tempo
+from mido.midifiles.meta import encode_variable_int
+
+from rhythm import timeline
 
 # -------------------------------
 # Save melody (list of notes) to MIDI
@@ -11,10 +15,119 @@ def save_melody_to_midi(melody_events, filename):
     track = MidiTrack()
     mid.tracks.append(track)
 
-    NOTE_DURATION_TICKS = 240
-    for note, pause in melody_events:
-        track.append(Message('note_on', note=int(note), velocity=64, time=int(pause)))
-        track.append(Message('note_off', note=int(note), velocity=64, time=NOTE_DURATION_TICKS))
+    # (pitch, rhythm) events laid out in beats, see rhythm.timeline
+    position = 0
+    for note, start, length in timeline(melody_events):
+        on, off = int(round(start * mid.ticks_per_beat)), int(round((start + length) * mid.ticks_per_beat))
+        track.append(Message('note_on', note=note, velocity=64, time=on - position))
+        track.append(Message('note_off', note=note, velocity=64, time=off - on))
+        position = off
+
+    mid.save(filename)
+
+# -------------------------------
+# Stream melody (any iterable of notes) to MIDI
+# -------------------------------
+def stream_melody_to_midi(melody_events, filename, chunk_size=1024, ticks_per_beat=480):
+    """
+    Writes melody events to a MIDI file as they arrive, in constant memory.
+
+    Produces the same notes as `save_melody_to_midi`, but consumes
+    `melody_events` lazily (e.g. from `MelodyGenerator.generate_stream`)
+    and flushes the track to disk every `chunk_size` notes, so the start of
+    a long piece is on disk while the rest is still being generated. The
+    track length in the chunk header is filled in when the melody ends.
+
+    Returns:
+        int: Number of notes written.
+    """
+    note_count = 0
+    position = 0
+    with open(filename, 'wb') as f:
+        # Format 0 header with one track, then a track chunk whose length is patched at the end.
+        f.write(b'MThd' + struct.pack('>LHHH', 6, 0, 1, ticks_per_beat))
+        f.write(b'MTrk')
+        length_pos = f.tell()
+        f.write(struct.pack('>L', 0))
+        track_start = f.tell()
+
+        # Raw channel-0 status bytes; building mido Messages per note is far slower.
+        buffer = bytearray()
+        for note, start, length in timeline(melody_events):
+            on, off = int(round(start * ticks_per_beat)), int(round((start + length) * ticks_per_beat))
+            buffer += bytes(encode_variable_int(on - position))
+            buffer += bytes((0x90, note, 64))
+            buffer += bytes(encode_variable_int(off - on))
+            buffer += bytes((0x80, note, 64))
+            position = off
+            note_count += 1
+            if note_count % chunk_size == 0:
+                f.write(buffer)
+                f.flush()
+                buffer.clear()
+        buffer += bytes(encode_variable_int(0)) + bytes(MetaMessage('end_of_track').bytes())
+        f.write(buffer)
+
+        track_length = f.tell() - track_start
+        f.seek(length_pos)
+        f.write(struct.pack('>L', track_length))
+    return note_count
+
+# -------------------------------
+# Melody + chords straight to one multi-track MIDI
+# -------------------------------
+def export_midi(melody_events, chords, filename, title=None, tempo_bpm=100,
+                chord_length=4.0, ticks_per_beat=480, beats=None):
+    """
+    Writes melody and chords to one format-1 MIDI file without building a music21 Score.
+
+    Produces the same music as `composer.build_score`: the melody line laid
+    out by `rhythm.timeline`, over block chords.
+
+    Args:
+        melody_events (list): (pitch, rhythm) events.
+        chords (iterable): ChordSpecs from `chord_progression`, each held
+            for `chord_length` quarters, or music21 Chords (e.g. the stream
+            from `generate_chords`), each held for its quarterLength.
+        title (str): Optional track name for the conductor track.
+        beats (float): Cut the melody off at this length, as `rhythm.timeline` does.
+    """
+    mid = MidiFile(type=1, ticks_per_beat=ticks_per_beat)
+
+    conductor = MidiTrack()
+    if title:
+        conductor.append(MetaMessage('track_name', name=title, time=0))
+    conductor.append(MetaMessage('time_signature', numerator=4, denominator=4, time=0))
+    conductor.append(MetaMessage('set_tempo', tempo=bpm2tempo(tempo_bpm), time=0))
+    mid.tracks.append(conductor)
+
+    melody_track = MidiTrack()
+    melody_track.append(MetaMessage('track_name', name='Melody', time=0))
+    position = 0
+    for pitch, start, length in timeline(melody_events, beats):
+        on = int(round(start * ticks_per_beat))
+        off = int(round((start + length) * ticks_per_beat))
+        melody_track.append(Message('note_on', channel=0, note=pitch, velocity=90, time=on - position))
+        melody_track.append(Message('note_off', channel=0, note=pitch, velocity=0, time=off - on))
+        position = off
+    mid.tracks.append(melody_track)
+
+    chord_track = MidiTrack()
+    chord_track.append(MetaMessage('track_name', name='Chords', time=0))
+    for c in chords:
+        if getattr(c, 'isChord', False):
+            pitches, length = [p.midi for p in c.pitches], float(c.quarterLength)
+        elif hasattr(c, 'numeral'):            # ChordSpec from chord_progression
+            pitches, length = c.pitches, chord_length
+        else:                                  # skip tempo marks etc.
+            continue
+        chord_ticks = int(round(length * ticks_per_beat))
+        for p in pitches:
+            chord_track.append(Message('note_on', channel=1, note=p, velocity=70, time=0))
+        for i, p in enumerate(pitches):
+            chord_track.append(Message('note_off', channel=1, note=p, velocity=0,
+                                       time=chord_ticks if i == 0 else 0))
+    mid.tracks.append(chord_track)
 
     mid.save(filename)
 
@@ -22,9 +135,7 @@ def save_melody_to_midi(melody_events, filename):
 # Combine melody + chords into one MIDI
 # -------------------------------
 def combine_chords_and_melody(chords_stream, melody_events, filename):
-    chords_stream.write("midi", fp=filename.replace(".mid", "_chords.mid"))
-    save_melody_to_midi(melody_events, filename.replace(".mid", "_melody.mid"))
-    # (Later you can merge tracks if you want them in one file)
+    export_midi(melody_events, chords_stream, filename)
 
 # -------------------------------
 # Try to open file in MuseScore
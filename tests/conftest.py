@@ -0,0 +1,30 @@
+import os
+import random
+import sys
+
+import pytest
+from mido import Message, MidiFile, MidiTrack
+
+# The modules under test live in src/ and import each other by plain name
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+def _write_midi(path, seed, notes=80):
+    rng = random.Random(seed)
+    track = MidiTrack()
+    pitch = 60
+    for _ in range(notes):
+        pitch = min(84, max(48, pitch + rng.choice((-3, -2, -1, 1, 2, 4))))
+        track.append(Message('note_on', note=pitch, velocity=80, time=rng.choice((0, 240, 480))))
+        track.append(Message('note_off', note=pitch, velocity=0, time=rng.choice((120, 240, 480))))
+    mid = MidiFile(ticks_per_beat=480)
+    mid.tracks.append(track)
+    mid.save(path)
+
+
+@pytest.fixture
+def write_midi():
+    """write_midi(path, seed, notes=80): a random-walk melody, the same for the same seed."""
+    return _write_midi
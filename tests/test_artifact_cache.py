@@ -0,0 +1,66 @@
+"""
+Finished compositions are answered from the artifact cache, and the cache
+evicts its least recently used entries beyond `max_entries`.
+"""
+
+import os
+import random
+
+import pytest
+
+from artifact_cache import ArtifactCache
+from composer import compose
+from markov_chain import MarkovChain
+from melody_generator import MelodyGenerator
+
+
+@pytest.fixture
+def generator():
+    rng = random.Random(0)
+    generator = MelodyGenerator()
+    generator.chain = MarkovChain.from_sequences(
+        [[(rng.randint(55, 79), rng.choice((65, 67, 89))) for _ in range(200)] for _ in range(4)])
+    return generator
+
+
+def entries(cache):
+    return sorted(name.split('.', 1)[0] for shard in os.listdir(cache.directory)
+                  for name in os.listdir(os.path.join(cache.directory, shard)))
+
+
+def test_identical_request_is_a_cache_hit(tmp_path, generator):
+    cache = ArtifactCache(str(tmp_path))
+    first = compose(generator, "C", "major", 2, "both", None, seed=7, cache=cache)
+    mtime = os.path.getmtime(first["musicxml"])
+    second = compose(generator, "C", "major", 2, "both", None, seed=7, cache=cache)
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert {k: v for k, v in second.items() if k != "cached"} == {k: v for k, v in first.items() if k != "cached"}
+    assert os.path.getmtime(second["musicxml"]) == mtime
+
+    # A different seed is a different piece; the MIDI-only key is reused for "both"
+    assert compose(generator, "C", "major", 2, "midi", None, seed=8, cache=cache)["cached"] is False
+    assert compose(generator, "C", "major", 2, "midi", None, seed=7, cache=cache)["cached"] is True
+
+
+def test_prune_keeps_the_most_recently_used(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    keys = [cache.key(n=n) for n in range(5)]
+    for age, key in enumerate(keys):
+        cache.put_meta(key, {"n": age})
+        open(cache.path(key, ".mid"), "wb").close()
+        for suffix in (".json", ".mid"):
+            os.utime(cache.path(key, suffix), (1000 + age, 1000 + age))
+    cache.lookup(keys[0], [".mid"])                 # a hit makes the oldest the newest
+
+    assert cache.prune(3) == 2
+    assert entries(cache) == sorted([keys[0]] * 2 + [keys[3]] * 2 + [keys[4]] * 2)
+    assert cache.prune(3) == 0
+
+
+def test_put_meta_prunes_every_prune_every_writes(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_entries=4, prune_every=3)
+    for n in range(6):
+        cache.put_meta(cache.key(n=n), {})
+        os.utime(cache.path(cache.key(n=n), ".json"), (1000 + n, 1000 + n))
+        expected = {0: 1, 1: 2, 2: 3, 3: 4, 4: 5, 5: 4}[n]     # pruned on the 3rd and 6th write
+        assert len(entries(cache)) == expected
@@ -0,0 +1,72 @@
+"""
+Round trips of the binary melody and chord encoding, on both sides of the
+vectorized decoder's threshold, legacy JSON rows, and the flag that tells
+rhythm-coded melodies from legacy tick deltas.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import rhythm
+from composition_codec import (DECODE_VECTORIZE_MIN_EVENTS, decode_chords, decode_melody,
+                               encode_chords, encode_melody, melody_timing)
+
+SIZES = [0, 1, DECODE_VECTORIZE_MIN_EVENTS - 1, DECODE_VECTORIZE_MIN_EVENTS,
+         DECODE_VECTORIZE_MIN_EVENTS + 1, 4096]
+
+
+@pytest.mark.parametrize("count", SIZES)
+@pytest.mark.parametrize("compress", [False, True])
+def test_melody_round_trip(count, compress):
+    rng = np.random.default_rng(count)
+    melody = list(zip(rng.integers(0, 128, count).tolist(), rng.integers(0, rhythm.CODES, count).tolist()))
+    assert decode_melody(encode_melody(melody, compress=compress)) == melody
+
+
+@pytest.mark.parametrize("count", SIZES)
+def test_multi_byte_values_round_trip(count):
+    # Legacy tick deltas, wide enough for three-byte varints
+    rng = np.random.default_rng(count)
+    melody = list(zip(rng.integers(0, 128, count).tolist(), rng.integers(0, 1 << 21, count).tolist()))
+    assert decode_melody(encode_melody(melody, rhythm=False)) == melody
+
+
+def test_chords_round_trip():
+    chords = ["I", "vi", "IV", "V7", "iiø7", ""]
+    assert decode_chords(encode_chords(chords)) == chords
+    assert decode_chords(encode_chords(chords * 50, compress=True)) == chords * 50
+    # Data the packed form cannot hold falls back to JSON inside the envelope
+    assert decode_chords(encode_chords([["C", "E", "G"]])) == [["C", "E", "G"]]
+
+
+def test_legacy_json_rows_decode():
+    assert decode_melody(json.dumps([[67, 200], [69, 0]])) == [(67, 200), (69, 0)]
+    assert decode_chords(json.dumps(["I", "V"])) == ["I", "V"]
+
+
+def test_rejects_invalid_input():
+    with pytest.raises(ValueError):
+        encode_melody([(128, 0)])
+    with pytest.raises(ValueError):
+        decode_melody(b"XX\x01\x00")
+
+
+# -------------------------------
+# Timing semantics
+# -------------------------------
+def test_timing_flag_tells_rhythm_codes_from_tick_deltas():
+    assert melody_timing(encode_melody([(60, rhythm.EIGHTH)])) == "rhythm"
+    assert melody_timing(encode_melody([(67, 200)], rhythm=False)) == "ticks"
+    assert melody_timing(json.dumps([[67, 200]])) == "ticks"
+    # Read from the envelope, so compression does not hide it
+    assert melody_timing(encode_melody([(60, rhythm.EIGHTH)] * 100, compress=True)) == "rhythm"
+
+
+@pytest.mark.parametrize("count", [1, DECODE_VECTORIZE_MIN_EVENTS + 1])
+def test_rhythm_melodies_reject_values_outside_the_grid(count):
+    with pytest.raises(ValueError):
+        encode_melody([(60, 0)] * (count - 1) + [(67, rhythm.CODES)])
+    with pytest.raises(ValueError):
+        encode_melody([(60, -1)])
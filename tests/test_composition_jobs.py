@@ -0,0 +1,101 @@
+"""
+The background composition queue: bounded admission (QueueFull, answered
+with 429 by the API), recovery after a worker process dies, and a retry
+after the model could not be prepared.
+"""
+
+import os
+import signal
+import time
+
+import pytest
+
+import composition_jobs
+from composition_jobs import DONE, FAILED, RUNNING, CompositionQueue, QueueFull
+
+PARAMS = {"key": "C", "mode": "major", "bars": 2, "format": "midi", "seed": 1}
+
+
+@pytest.fixture
+def corpus(tmp_path, write_midi):
+    folder = tmp_path / "corpus"
+    folder.mkdir()
+    for i in range(3):
+        write_midi(folder / f"piece_{i}.mid", seed=i)
+    return folder
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(training_data_path, **options):
+        queue = CompositionQueue(str(training_data_path), str(tmp_path / "cache" / "model.npz"),
+                                 str(tmp_path / "jobs"), **options)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+
+def wait_for(queue, job_id, statuses=(DONE, FAILED), timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.status(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_full_queue_rejects_then_accepts_again(corpus, make_queue):
+    queue = make_queue(corpus, workers=1, max_pending=1)
+    first = queue.submit(PARAMS, owner="ann")
+    with pytest.raises(QueueFull):
+        queue.submit(PARAMS, owner="bob")
+    job = wait_for(queue, first)
+    assert job["status"] == DONE and job["owner"] == "ann"
+    assert os.path.exists(job["result"]["midi"])
+    assert queue.pending == 0
+
+    # The identical request is answered from the artifact cache
+    second = wait_for(queue, queue.submit(PARAMS, owner="bob"))
+    assert second["result"]["cached"] is True
+    assert queue.pending == 0
+
+
+def test_queue_recovers_after_a_worker_dies(corpus, make_queue):
+    queue = make_queue(corpus, workers=1, max_pending=4)
+    wait_for(queue, queue.submit(PARAMS))
+    broken = queue._pool
+
+    # A long job, killed with its worker while it runs
+    victim = queue.submit(dict(PARAMS, bars=64, format="both", seed=2))
+    wait_for(queue, victim, statuses=(RUNNING, DONE, FAILED))
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+    job = wait_for(queue, victim)
+    if job["status"] == DONE:
+        pytest.skip("the job finished before its worker could be killed")
+    assert "terminated abruptly" in job["error"]
+    assert queue._pool is not broken
+
+    after = wait_for(queue, queue.submit(dict(PARAMS, seed=3)))
+    assert after["status"] == DONE
+    assert queue.pending == 0
+
+
+def test_failed_model_preparation_is_retried(tmp_path, corpus, make_queue, monkeypatch):
+    missing = tmp_path / "not yet"
+    queue = make_queue(missing, workers=1)
+    job = wait_for(queue, queue.submit(PARAMS))
+    assert job["status"] == FAILED and job["error"].startswith("Model unavailable")
+    with pytest.raises(RuntimeError):
+        queue.submit(PARAMS)                        # within START_RETRY_SECONDS
+    assert queue.pending == 0
+
+    corpus.rename(missing)
+    monkeypatch.setattr(composition_jobs, "START_RETRY_SECONDS", 0.0)
+    assert wait_for(queue, queue.submit(PARAMS))["status"] == DONE
@@ -0,0 +1,56 @@
+"""
+Paginated listing and single-composition loads of the SQLite layer.
+"""
+
+import pytest
+
+import database_manager
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(database_manager, "DATABASE_NAME", str(tmp_path / "compositions.db"))
+    database_manager.create_database()
+    yield database_manager
+    database_manager.close_connections()
+
+
+def test_pages_cover_a_bulk_insert_with_tied_timestamps(database):
+    # One transaction, so (almost) every row gets the same one-second timestamp
+    database.save_compositions((f"piece {i}", [(60, 5)], ["I"], "C") for i in range(250))
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = database.list_compositions(limit=20, cursor=cursor)
+        seen += [row[0] for row in rows]
+        pages += 1
+        if cursor is None:
+            break
+    assert pages == 13
+    assert seen == sorted(seen, reverse=True)
+    assert sorted(seen) == [c["id"] for c in database.iter_compositions(include_data=False)]
+
+
+def test_page_query_seeks_on_the_primary_key(database):
+    with database.connection() as conn:
+        plan = conn.execute("""
+            EXPLAIN QUERY PLAN SELECT id, name, timestamp FROM compositions
+            WHERE id < ? ORDER BY id DESC LIMIT ?
+        """, (100, 20)).fetchall()
+    assert any("INTEGER PRIMARY KEY (rowid<?)" in step[-1] for step in plan)
+
+
+def test_load_composition_by_id(database):
+    database.save_compositions([("first", [(60, 5), (64, 17)], ["I", "V"], "C"),
+                                ("second", [(62, 41)], ["ii"], "d")])
+    rows, _ = database.list_compositions()
+    second_id = rows[0][0]
+
+    composition = database.load_composition_by_id(second_id)
+    assert composition["name"] == "second" and composition["key"] == "d"
+    assert "melody" not in composition
+
+    composition = database.load_composition_by_id(second_id, include_data=True)
+    assert composition["melody"] == [(62, 41)]
+    assert composition["chords"] == ["ii"]
+    assert database.load_composition_by_id(second_id + 100) is None
@@ -0,0 +1,85 @@
+"""
+Incremental model updates must match a full retrain.
+"""
+
+import os
+import random
+import shutil
+from collections import Counter
+
+import pytest
+
+import rhythm
+from markov_chain import MarkovChain
+from melody_generator import MelodyGenerator
+
+
+def transitions(chain):
+    """Every level's {(context events, next event): count}, independent of state IDs."""
+    events = [tuple(row) for row in chain.events.tolist()]
+    levels = []
+    for contexts, next_ids, counts in chain._ngram_counts():
+        levels.append({(tuple(events[s] for s in context), events[nxt]): count
+                       for context, nxt, count in zip(contexts.tolist(), next_ids.tolist(), counts.tolist())})
+    return levels
+
+
+def random_sequences(rng, count, length=60):
+    return [[(rng.randint(55, 67), rng.randrange(rhythm.CODES)) for _ in range(rng.randint(1, length))]
+            for _ in range(count)]
+
+
+# -------------------------------
+# Incremental updates
+# -------------------------------
+@pytest.mark.parametrize("order", [1, 2, 3])
+def test_updated_matches_full_train(order):
+    rng = random.Random(order)
+    first, second = random_sequences(rng, 12), random_sequences(rng, 8)
+    chain = MarkovChain.from_sequences(first, order=order)
+
+    grown = chain.updated(add=second)
+    assert transitions(grown) == transitions(MarkovChain.from_sequences(first + second, order=order))
+
+    shrunk = grown.updated(remove=first[:5] + second[:3])
+    expected = MarkovChain.from_sequences(first[5:] + second[3:], order=order)
+    assert transitions(shrunk) == transitions(expected)
+
+
+@pytest.mark.parametrize("order", [1, 2, 3])
+def test_generator_update_and_remove_match_train(tmp_path, write_midi, order):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    for i in range(4):
+        write_midi(corpus / f"piece_{i}.mid", seed=i)
+    # A duplicate of piece_0 that takes over its events once piece_0 is removed
+    shutil.copy(corpus / "piece_0.mid", corpus / "piece_0_copy.mid")
+
+    generator = MelodyGenerator(order=order)
+    generator.train(str(corpus))
+    write_midi(corpus / "piece_4.mid", seed=4)
+    write_midi(corpus / "piece_1.mid", seed=11)            # changed contents
+    generator.update([str(corpus / "piece_4.mid"), str(corpus / "piece_1.mid")])
+    os.remove(corpus / "piece_0.mid")
+    os.remove(corpus / "piece_2.mid")
+    generator.remove([str(corpus / "piece_0.mid"), str(corpus / "piece_2.mid")])
+
+    retrained = MelodyGenerator(order=order)
+    retrained.train(str(corpus))
+    assert transitions(generator.chain) == transitions(retrained.chain)
+    assert generator.trained_notes == retrained.trained_notes
+    assert sorted(generator.file_digests) == sorted(retrained.file_digests)
+
+
+def test_removing_every_copy_counts_the_file_out(tmp_path, write_midi):
+    write_midi(tmp_path / "a.mid", seed=1)
+    write_midi(tmp_path / "b.mid", seed=2)
+    shutil.copy(tmp_path / "a.mid", tmp_path / "a_copy.mid")
+    generator = MelodyGenerator(order=2)
+    generator.train(str(tmp_path))
+    generator.remove([str(tmp_path / "a.mid"), str(tmp_path / "a_copy.mid")])
+
+    remaining = generator.file_events[str(tmp_path / "b.mid")]
+    assert transitions(generator.chain) == transitions(MarkovChain.from_sequences([remaining], order=2))
+    assert generator.trained_notes == Counter(int(pitch) for pitch, _ in remaining)
+
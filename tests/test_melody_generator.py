@@ -0,0 +1,26 @@
+"""
+Training builds the same model however many processes parse the corpus.
+"""
+
+import os
+
+from melody_generator import MelodyGenerator
+
+
+def test_serial_and_parallel_training_build_the_same_chain(tmp_path, write_midi):
+    for i in range(6):
+        write_midi(tmp_path / f"piece_{i}.mid", seed=i)
+    (tmp_path / "broken.mid").write_bytes(b"not a MIDI file")
+
+    models = []
+    for workers in (None, 2, 0):
+        generator = MelodyGenerator(order=2)
+        generator.train(str(tmp_path), workers=workers)
+        models.append(generator)
+
+    serial = models[0]
+    assert len(serial.chain) > 0
+    for parallel in models[1:]:
+        assert parallel.chain.fingerprint() == serial.chain.fingerprint()
+        assert parallel.trained_notes == serial.trained_notes
+        assert [os.path.basename(r.path) for r in parallel.failed_files] == ["broken.mid"]
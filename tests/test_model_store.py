@@ -0,0 +1,99 @@
+"""
+The on-disk model cache: save/load round trips, reuse for an unchanged
+corpus and a rebuild when the format version changes; and the shared
+memory-mapped model, which must generate exactly like the in-memory one.
+"""
+
+import random
+
+import pytest
+
+import model_store
+from melody_generator import MelodyGenerator
+from model_store import (attach_shared, corpus_fingerprint, load_model, load_or_train, save_model,
+                         save_shared, scan_corpus)
+
+
+@pytest.fixture
+def corpus(tmp_path, write_midi):
+    folder = tmp_path / "corpus"
+    folder.mkdir()
+    for i in range(4):
+        write_midi(folder / f"piece_{i}.mid", seed=i)
+    return folder
+
+
+def melody(generator, seed=0):
+    return generator.generate(64, key="C", temperature=1.2, rng=random.Random(seed))
+
+
+@pytest.mark.parametrize("order", [1, 3])
+def test_save_and_load_round_trip(tmp_path, corpus, order):
+    trained = MelodyGenerator(order=order)
+    trained.train(str(corpus))
+    manifest = scan_corpus(str(corpus))
+    path = str(tmp_path / "model.npz")
+    save_model(trained, path, manifest)
+
+    loaded = MelodyGenerator(order=order)
+    assert load_model(loaded, path, corpus_fingerprint(manifest))
+    assert loaded.chain.fingerprint() == trained.chain.fingerprint()
+    assert loaded.trained_notes == trained.trained_notes
+    assert loaded.file_digests == trained.file_digests
+    assert {p: e.tolist() for p, e in loaded.file_events.items()} == \
+           {p: e.tolist() for p, e in trained.file_events.items()}
+    assert melody(loaded) == melody(trained)
+
+    # Another corpus or another order is not loaded
+    assert not load_model(MelodyGenerator(order=order), path, "another corpus")
+    assert not load_model(MelodyGenerator(order=order + 1), path, None)
+
+
+def test_unchanged_corpus_is_loaded_not_retrained(tmp_path, corpus, monkeypatch):
+    cache_path = str(tmp_path / "cache" / "model.npz")
+    first = MelodyGenerator()
+    assert load_or_train(first, str(corpus), cache_path) is False
+
+    def no_training(*args, **kwargs):
+        raise AssertionError("retrained an unchanged corpus")
+
+    second = MelodyGenerator()
+    monkeypatch.setattr(second, "train", no_training)
+    assert load_or_train(second, str(corpus), cache_path) is True
+    assert second.chain.fingerprint() == first.chain.fingerprint()
+
+
+def test_format_version_bump_forces_a_rebuild(tmp_path, corpus, monkeypatch):
+    cache_path = str(tmp_path / "model.npz")
+    load_or_train(MelodyGenerator(), str(corpus), cache_path)
+
+    monkeypatch.setattr(model_store, "FORMAT_VERSION", model_store.FORMAT_VERSION + 1)
+    assert model_store.read_manifest(cache_path)[0] != model_store.FORMAT_VERSION
+    assert load_or_train(MelodyGenerator(), str(corpus), cache_path) is False
+    assert model_store.read_manifest(cache_path)[0] == model_store.FORMAT_VERSION
+
+
+# -------------------------------
+# Shared read-only model
+# -------------------------------
+@pytest.mark.parametrize("order", [1, 2])
+def test_attached_shared_model_generates_like_the_in_memory_one(tmp_path, corpus, order):
+    trained = MelodyGenerator(order=order)
+    trained.train(str(corpus))
+    shared = str(tmp_path / "model.shared")
+    save_shared(trained, shared, temperatures=(1.0, 1.2))
+
+    attached = MelodyGenerator(order=order)
+    assert attach_shared(attached, shared)
+    assert not attached.chain.events.flags.writeable
+    assert attached.chain.fingerprint() == trained.chain.fingerprint()
+    assert attached.trained_notes == trained.trained_notes
+    for temperature in (1.0, 1.2, 0.7):             # 0.7 was not stored
+        for seed in range(3):
+            assert attached.generate(64, key="G", temperature=temperature, rng=random.Random(seed)) == \
+                   trained.generate(64, key="G", temperature=temperature, rng=random.Random(seed))
+    assert (attached.generate_batch(4, 32, seed=1) == trained.generate_batch(4, 32, seed=1)).all()
+
+    # Republishing the same model reuses its version folder
+    assert save_shared(trained, shared, temperatures=(1.0, 1.2)) == save_shared(trained, shared, (1.2,))
+    assert not attach_shared(MelodyGenerator(order=order + 1), shared)
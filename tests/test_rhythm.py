@@ -0,0 +1,40 @@
+"""
+Quantization onto the rhythm grid and laying rhythm codes out in beats.
+"""
+
+import pytest
+
+import rhythm
+
+
+def code(delta, duration):
+    return rhythm.DELTAS.index(delta) * len(rhythm.DURATIONS) + rhythm.DURATIONS.index(duration)
+
+
+def test_quantize_snaps_to_the_nearest_grid_value():
+    codes = rhythm.quantize([0.0, 0.03, 0.52, 0.98, 0.34, 7.0], [0.5, 0.26, 0.49, 1.1, 0.3, 9.0])
+    assert codes.tolist() == [code(0.0, 1 / 2), code(0.0, 1 / 4), code(1 / 2, 1 / 2),
+                              code(1.0, 1.0), code(1 / 3, 1 / 3), code(4.0, 4.0)]
+    assert rhythm.EIGHTH == code(1 / 2, 1 / 2)
+
+
+def test_decode_inverts_every_code():
+    for c in range(rhythm.CODES):
+        delta, duration = rhythm.decode(c)
+        assert code(delta, duration) == c
+
+
+@pytest.mark.parametrize("value", [-1, rhythm.CODES, 200])
+def test_decode_rejects_values_that_are_not_rhythm_codes(value):
+    # e.g. a raw tick delta from a composition stored before the rhythm grid
+    with pytest.raises(ValueError):
+        rhythm.decode(value)
+
+
+def test_timeline_and_fit():
+    quarter = code(1.0, 1.0)
+    events = [(60, quarter), (62, code(0.0, 1 / 2)), (64, quarter), (65, quarter)]
+    # A note struck with the previous one waits for it to end
+    assert list(rhythm.timeline(events)) == [(60, 0.0, 1.0), (62, 1.0, 0.5), (64, 2.0, 1.0), (65, 3.0, 1.0)]
+    assert list(rhythm.timeline(events, beats=2.5)) == [(60, 0.0, 1.0), (62, 1.0, 0.5), (64, 2.0, 0.5)]
+    assert rhythm.fit(iter(events), 2.5) == events[:3]
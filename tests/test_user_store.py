@@ -0,0 +1,97 @@
+"""
+Sign-ups are decided by the store's unique index: of several racing
+registrations for one name exactly one succeeds. A MongoDB index the
+server rejects is reported once and not retried.
+"""
+
+import threading
+
+import pytest
+
+from user_store import MongoUserStore, SQLiteUserStore, UserExists, UserStoreError, open_user_store
+
+
+@pytest.fixture(params=["memory", "file"])
+def store(request, tmp_path):
+    store = open_user_store("sqlite://" if request.param == "memory" else f"sqlite:///{tmp_path / 'users.db'}")
+    yield store
+    store.close()
+
+
+def test_racing_sign_ups_for_one_name_create_one_user(store):
+    threads = 16
+    barrier = threading.Barrier(threads)
+    created, exists = [], []
+
+    def register(i):
+        barrier.wait()
+        try:
+            store.create("ann", f"hash-{i}".encode())
+            created.append(i)
+        except UserExists:
+            exists.append(i)
+
+    workers = [threading.Thread(target=register, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(created) == 1 and len(exists) == threads - 1
+    assert store.find("ann") == {"username": "ann", "password": f"hash-{created[0]}".encode()}
+    assert store.find("bob") is None
+
+
+def test_open_user_store_picks_the_backend(tmp_path):
+    for uri, backend in (("sqlite://", SQLiteUserStore),
+                         (f"sqlite:///{tmp_path / 'users.db'}", SQLiteUserStore),
+                         ("mongodb://localhost:1", MongoUserStore)):     # not dialled until first use
+        store = open_user_store(uri)
+        assert isinstance(store, backend)
+        store.close()
+
+
+class _Collection:
+    """Just enough of a pymongo collection to count index builds."""
+
+    def __init__(self, error):
+        self.error = error
+        self.index_calls = 0
+
+    def create_index(self, *args, **kwargs):
+        self.index_calls += 1
+        if self.error is not None:
+            raise self.error
+
+    def find_one(self, *args):
+        return None
+
+    def insert_one(self, document):
+        pass
+
+
+def test_rejected_index_is_reported_once_and_not_retried(capsys):
+    errors = pytest.importorskip("pymongo.errors")
+    store = MongoUserStore("mongodb://localhost:1")
+    store.users = _Collection(errors.DuplicateKeyError("E11000 duplicate key error", 11000))
+
+    for _ in range(3):
+        assert store.find("ann") is None
+    for _ in range(2):
+        with pytest.raises(UserStoreError, match="duplicate usernames must be resolved"):
+            store.create("ann", b"hash")
+    assert store.users.index_calls == 1
+    assert capsys.readouterr().out.count("duplicate usernames must be resolved") == 1
+
+
+def test_unreachable_server_is_retried_by_create():
+    errors = pytest.importorskip("pymongo.errors")
+    store = MongoUserStore("mongodb://localhost:1")
+    store.users = _Collection(errors.ServerSelectionTimeoutError("no servers"))
+    assert store.find("ann") is None
+    assert store.find("ann") is None            # within INDEX_RETRY_SECONDS: no new attempt
+    assert store.users.index_calls == 1
+
+    store.users.error = None
+    store.create("ann", b"hash")
+    assert store.users.index_calls == 2